@@ -174,7 +174,6 @@ class LLM_activities_descriptor:
             input_variables=["pipeline_content", "question"],
             template=PIPELINE_DESCRIPTOR_TEMPLATE,
         )
-        )
 
         self.chat_llm = (
             Ollama(self.prompt)
@@ -62,7 +62,6 @@ class LLM_activities_used_columns:
             input_variables=["code", "description", "df_after", "df_before"],
             template=PIPELINE_STANDARDIZER_TEMPLATE,
         )
-        )
 
         self.ollama_chat = Ollama(self.prompt)
         self.groq_chat = Groq(self.prompt)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Compare the serial and the parallel FrameDiff of numeric columns.
+
+Run it from the repository root as
+``python -m benchmarks.bench_diff [ROWS [COLUMNS [WORKERS...]]]``;
+the parallel diff can only be faster with more than one available CPU,
+which is why --diff-workers defaults to the serial one.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from tracking.diff import FrameDiff
+import numpy as np
+import os
+import pandas as pd
+import sys
+
+
+def best_of(repeat, function, *args) -> float:
+    ret = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        function(*args)
+        ret = min(ret, perf_counter() - start)
+    return ret
+
+
+def diff(df1, df2, executor=None) -> None:
+    frame_diff = FrameDiff(df1, df2, executor)
+    for col in frame_diff.common_columns:
+        frame_diff.changed_cells(col)
+
+
+def main(rows=1_000_000, columns=20, *workers) -> None:
+    rng = np.random.default_rng(0)
+    df1 = pd.DataFrame(rng.random((rows, columns)))
+    df2 = df1.sample(frac=0.9, random_state=0)
+    df2.iloc[::7, ::2] = np.nan
+
+    print(f"{rows} rows, {columns} columns, {os.cpu_count()} CPUs")
+    diff(df1, df2)  # warm up the allocator and the caches
+    serial = best_of(3, diff, df1, df2)
+    print(f"serial:     {serial:.3f}s")
+    for n in workers or (2, 4, 8):
+        with ThreadPoolExecutor(n) as executor:
+            parallel = best_of(3, diff, df1, df2, executor)
+        print(f"{n} workers: {parallel:.3f}s ({serial / parallel:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
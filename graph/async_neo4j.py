@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from concurrent.futures import Future
+from graph.constants import (
+    ACTIVITY_LABEL,
+    BELONGS_RELATION,
+    COLUMN_LABEL,
+    DERIVATION_RELATION,
+    ENTITY_LABEL,
+    NEXT_RELATION,
+    WRITE_BATCH_SIZE,
+)
+from graph.neo4j import (
+    column_derivations_query,
+    edges_query,
+    forget_edges,
+    new_edges,
+    nodes_query,
+    relation_edges,
+)
+from logging import debug, warning
+from multiprocessing import cpu_count
+from neo4j import AsyncGraphDatabase
+from neo4j.exceptions import DriverError, Neo4jError
+from threading import Thread
+from typing import Dict, List, Optional, Tuple
+import asyncio
+
+#: Times a transaction failing with a retryable error is tried again
+RETRIES = 5
+
+#: Seconds waited before the first retry, doubled by each next one
+RETRY_DELAY = 0.1
+
+
+class AsyncNeo4jWriter:
+    """
+    Writer of the provenance graph through the asynchronous Neo4j
+    driver, whose event loop runs in a background thread: the records
+    of a batch are thus written while the next ones are extracted.
+
+    Each write() creates the nodes of its records concurrently, then
+    (once the previous write() is done) the relations type by type;
+    at most concurrency transactions of batch_size rows are in flight.
+    Transactions failing with a retryable error (e.g. a deadlock or a
+    cluster leader switch) are retried up to RETRIES times, with an
+    exponential backoff; any other error is raised by the next call
+    to write(), wait() or close() instead of being just logged.
+
+    write() blocks while max_pending writes are in progress, i.e. the
+    extraction is slowed down to the ingestion speed.
+
+    :param uri: The URI of the Neo4j database.
+    :param user: The username for accessing the Neo4j database.
+    :param pwd: The password for accessing the Neo4j database.
+    :param db: The database to write to, the default one if None.
+    :param concurrency: The maximum number of concurrent transactions,
+                        default cpu_count() - 1.
+    :param batch_size: The number of rows of each transaction.
+    :param max_pending: The maximum number of writes in progress.
+    :param merge_edges: Whether to MERGE the relations, see
+                        Neo4jQueries.
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        user: str,
+        pwd: str,
+        db: str = None,
+        concurrency: int = None,
+        batch_size: int = WRITE_BATCH_SIZE,
+        max_pending: int = 2,
+        merge_edges: bool = False,
+    ) -> None:
+        self.db = db
+        self.concurrency = concurrency or max(1, cpu_count() - 1)
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.merge_edges = merge_edges
+        self._edges = dict()  # (start, relation, end) -> written pairs
+        self._pending = list()  # futures of the writes in progress
+        self._previous = None  # asyncio future of the last write
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(
+            target=self._loop.run_forever,
+            name="neo4j-async-writer",
+            daemon=True,
+        )
+        self._thread.start()
+        self._driver, self._semaphore = self._submit(
+            self._open(uri, user, pwd)
+        ).result()
+
+    def write(self, records: Dict[str, list]) -> None:
+        """
+        Enqueue the writing of the records, by kind as buffered by
+        Neo4jSink (i.e. activity, column, entity, derivation,
+        derivation_column, relation, relation_column, membership and
+        next); the lists must not be modified afterwards.
+        """
+
+        nodes = [
+            (nodes_query(label), records[kind])
+            for label, kind in (
+                (ACTIVITY_LABEL, "activity"),
+                (COLUMN_LABEL, "column"),
+                (ENTITY_LABEL, "entity"),
+            )
+            if records.get(kind)
+        ]
+        edges = [
+            self._edges_batch(
+                ENTITY_LABEL,
+                DERIVATION_RELATION,
+                ENTITY_LABEL,
+                [
+                    {"start": derivation["gen"], "end": derivation["used"]}
+                    for derivation in records.get("derivation", ())
+                ],
+            )
+        ]
+        for label, kind in (
+            (ENTITY_LABEL, "relation"),
+            (COLUMN_LABEL, "relation_column"),
+        ):
+            edges.extend(
+                self._edges_batch(*relation)
+                for relation in relation_edges(records.get(kind, ()), label)
+            )
+        edges.append(
+            (
+                column_derivations_query(),
+                list(records.get("derivation_column", ())),
+                None,
+            )
+        )
+        edges.append(
+            self._edges_batch(
+                ENTITY_LABEL,
+                BELONGS_RELATION,
+                COLUMN_LABEL,
+                [
+                    {"start": entity, "end": column}
+                    for column, entities in records.get("membership", ())
+                    for entity in entities
+                ],
+            )
+        )
+        edges.append(  # like Neo4jQueries.add_next_operations()
+            (
+                edges_query(ACTIVITY_LABEL, NEXT_RELATION, ACTIVITY_LABEL),
+                [
+                    {"start": pair["act_in_id"], "end": pair["act_out_id"]}
+                    for pair in records.get("next", ())
+                ],
+                None,
+            )
+        )
+
+        # back-pressure: wait for the oldest writes in progress
+        while len(self._pending) >= self.max_pending:
+            self._pending.pop(0).result()
+        self._pending.append(
+            self._submit(
+                self._write(nodes, [edge for edge in edges if edge[1]])
+            )
+        )
+
+    def wait(self) -> None:
+        """Wait for the writes in progress, raising their errors"""
+        while self._pending:
+            self._pending.pop(0).result()
+
+    def close(self) -> None:
+        """Wait for the writes in progress and close the driver"""
+        try:
+            self.wait()
+        finally:
+            self._submit(self._driver.close()).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+    def _edges_batch(
+        self, start: str, relation: str, end: str, rows: List[dict]
+    ) -> Tuple[str, List[dict], Optional[set]]:
+        """
+        Return the query and the rows of the edges, and the set of the
+        written ones (see new_edges()) if any: the rows are checked
+        against it by _write(), in the thread of the event loop, once
+        the previous writes are done
+        """
+
+        written = None
+        if not self.merge_edges:
+            written = self._edges.setdefault((start, relation, end), set())
+        return (
+            edges_query(
+                start, relation, end, "MERGE" if self.merge_edges else "CREATE"
+            ),
+            rows,
+            written,
+        )
+
+    def _submit(self, coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def _open(self, uri: str, user: str, pwd: str):
+        return (
+            AsyncGraphDatabase.driver(uri, auth=(user, pwd)),
+            asyncio.Semaphore(self.concurrency),
+        )
+
+    async def _write(self, nodes, edges) -> None:
+        previous, done = self._previous, self._loop.create_future()
+        self._previous = done
+        edges = list(edges)
+        try:
+            try:
+                await asyncio.gather(
+                    *(self._batches(query, rows) for query, rows in nodes)
+                )
+            finally:
+                if previous is not None:
+                    await previous  # the nodes of the edges are written
+            while edges:
+                query, rows, written = edges.pop(0)
+                if written is not None:
+                    rows = new_edges(written, rows)
+                await self._batches(query, rows, written)
+        finally:
+            done.set_result(None)
+
+    async def _batches(
+        self, query: str, rows: list, written: Optional[set] = None
+    ) -> None:
+        """
+        Write the rows in batches, forgetting the edges of the failed
+        ones (see new_edges()) and then raising the first error
+        """
+
+        debug(query)
+        batches = [
+            rows[i : i + self.batch_size]  # noqa
+            for i in range(0, len(rows), self.batch_size)
+        ]
+        results = await asyncio.gather(
+            *(self._transaction(query, batch) for batch in batches),
+            return_exceptions=True,
+        )
+        failures = [
+            (batch, result)
+            for batch, result in zip(batches, results)
+            if isinstance(result, BaseException)
+        ]
+        if written is not None:
+            for batch, _ in failures:
+                forget_edges(written, batch)
+        if failures:
+            raise failures[0][1]
+
+    async def _transaction(self, query: str, rows: list) -> None:
+        async with self._semaphore:
+            for attempt in range(RETRIES + 1):
+                try:
+                    async with self._driver.session(
+                        database=self.db
+                    ) as session:
+                        tx = await session.begin_transaction()
+                        try:
+                            result = await tx.run(query, {"rows": rows})
+                            await result.consume()
+                            await tx.commit()
+                        finally:
+                            await tx.close()
+                    return
+                except (DriverError, Neo4jError) as e:
+                    if attempt == RETRIES or not e.is_retryable():
+                        raise
+                    warning(f"Retrying a Neo4j transaction after: {e}")
+                    await asyncio.sleep(RETRY_DELAY * 2**attempt)
@@ -28,6 +28,7 @@
 NAMESPACE_ACTIVITY = "activity:"
 NAMESPACE_COLUMN = "column:"
 NAMESPACE_ENTITY = "entity:"
+NAMESPACE_RULE = "rule:"
 NAMESPACE_TRACKER = "tracker:"
 
 # Neo4j CONSTANTS
@@ -39,10 +40,16 @@ COLUMN_LABEL = "Column"
 DERIVATION_RELATION = "WAS_DERIVED_FROM"
 ENTITY_CONSTRAINT = "constraint_entity_id"
 ENTITY_LABEL = "Entity"
+FOLLOWS_RELATION = "FOLLOWS"
 GENERATION_RELATION = "WAS_GENERATED_BY"
 INVALIDATION_RELATION = "WAS_INVALIDATED_BY"
 NEXT_RELATION = "NEXT"
+RULE_CONSTRAINT = "constraint_rule_id"
+RULE_LABEL = "Rule"
 USED_RELATION = "USED"
+# rows written by each transaction of
+# Neo4jQueryExecutor.insert_data_multiprocess()
+WRITE_BATCH_SIZE = 10_000
 
 FUNCTION_EXECUTION_TIMES = "function_execution_times.log"
 NEO4j_QUERY_EXECUTION_TIMES = "neo4j_query_execution_times.log"
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+from array import array
+from graph.constants import NAMESPACE_ENTITY
+from graph.ids import IdAllocator, default_allocator
+from typing import Dict
+import pandas as pd
+
+
+class _Codes:
+    """
+    Dictionary encoding: assign to each distinct value a small integer
+    code and keep the values in a list indexed by code.
+    """
+
+    def __init__(self) -> None:
+        self._codes = dict()
+        self.values = list()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def code(self, key, value=None) -> int:
+        """Return the code of key, assigning a new one if needed"""
+        ret = self._codes.get(key, None)
+        if ret is None:
+            ret = self._codes[key] = len(self.values)
+            self.values.append(key if value is None else value)
+        return ret
+
+    def get(self, key) -> int:
+        return self._codes.get(key, None)
+
+
+def _value_key(value):
+    """
+    Hashable key of a cell value: it keeps values of different types
+    apart (1, 1.0 and True would be the same dictionary key) and all
+    the missing ones together (NaN != NaN).
+    """
+
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return (type(value), None)
+    return (type(value), value)
+
+
+class EntityTable:
+    """
+    Columnar store of the provenance entities (i.e. cells).
+
+    Instead of a dictionary per entity, entities are rows of parallel
+    append-only arrays holding their id and the dictionary codes of
+    their feature name, index label and value (whose type is kept in
+    the value dictionary); a hash index maps (value, feature, index)
+    to the row of the last entity created for that cell.
+
+    Rows are rendered as the dictionaries returned by
+    structure.create_entity() only when read, e.g. by slicing the
+    table or through values().
+
+    :param ids: The IdAllocator to use, the default one if None.
+    """
+
+    def __init__(self, ids: IdAllocator = None) -> None:
+        self.id_allocator = ids or default_allocator
+        self._ids = array("q")
+        self._features = array("q")
+        self._indexes = array("q")
+        self._values = array("q")
+
+        self._feature_codes = _Codes()
+        self._index_codes = _Codes()
+        self._value_codes = _Codes()
+
+        self._rows = dict()  # hash index
+
+    def __contains__(self, key) -> bool:
+        return self._row(*key) is not None
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.row(i) for i in range(len(self))[item]]
+        return self.row(item)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, value, feature_name: str, index) -> int:
+        """
+        Append a new entity for the given cell, which becomes the one
+        returned by later lookups of the same cell, and return its ID.
+        """
+
+        key = (
+            self._value_codes.code(_value_key(value), value),
+            self._feature_codes.code(feature_name),
+            self._index_codes.code(index),
+        )
+        self._rows[key] = len(self._ids)
+        self._ids.append(
+            self.id_allocator(NAMESPACE_ENTITY, feature_name, index, value)
+        )
+        self._values.append(key[0])
+        self._features.append(key[1])
+        self._indexes.append(key[2])
+        return self._ids[-1]
+
+    def get(self, value, feature_name: str, index) -> int:
+        """Return the ID of the entity of a cell, or None"""
+        row = self._row(value, feature_name, index)
+        return self._ids[row] if row is not None else None
+
+    def get_or_add(self, value, feature_name: str, index) -> int:
+        """Return the ID of the entity of a cell, adding it if missing"""
+        ret = self.get(value, feature_name, index)
+        if ret is None:
+            ret = self.add(value, feature_name, index)
+        return ret
+
+    def row(self, i: int) -> Dict[str, any]:
+        """Render the i-th entity like structure.create_entity() does"""
+        value = self._value_codes.values[self._values[i]]
+        return {
+            "id": self._ids[i],
+            "value": value,
+            "type": type(value).__name__,
+            "feature_name": self._feature_codes.values[self._features[i]],
+            "index": self._index_codes.values[self._indexes[i]],
+            "name": list(),
+        }
+
+    def values(self):
+        """Iterate over all the entities, rendered as dictionaries"""
+        return (self.row(i) for i in range(len(self)))
+
+    def _row(self, value, feature_name: str, index):
+        value_code = self._value_codes.get(_value_key(value))
+        feature_code = self._feature_codes.get(feature_name)
+        index_code = self._index_codes.get(index)
+        if value_code is None or feature_code is None or index_code is None:
+            return None
+        return self._rows.get((value_code, feature_code, index_code), None)
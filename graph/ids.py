@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+from array import array
+from graph.constants import (
+    NAMESPACE_ACTIVITY,
+    NAMESPACE_COLUMN,
+    NAMESPACE_ENTITY,
+)
+from hashlib import blake2b
+from typing import Union
+
+NAMESPACES = (NAMESPACE_ACTIVITY, NAMESPACE_COLUMN, NAMESPACE_ENTITY)
+
+
+class _DigestSet:
+    """
+    Set of 63-bit digests stored in an open addressing hash table: a
+    flat array of 64-bit slots, at most half of them used, instead of
+    a Python int (and a hash table entry) for each digest.
+    """
+
+    def __init__(self, capacity: int = 1 << 10) -> None:
+        self._slots = array("q", bytes(8 * capacity))  # 0 == empty slot
+        self._mask = capacity - 1  # capacity is a power of 2
+        self._len = 0
+        self._zero = False  # whether the digest 0 was added
+
+    def __len__(self) -> int:
+        return self._len + self._zero
+
+    def add(self, digest: int) -> bool:
+        """Add a digest, return whether it was already in the set"""
+        if digest == 0:
+            found, self._zero = self._zero, True
+            return found
+        slots, mask = self._slots, self._mask
+        i = digest & mask
+        slot = slots[i]
+        while slot:
+            if slot == digest:
+                return True
+            i = (i + 1) & mask  # linear probing
+            slot = slots[i]
+        slots[i] = digest
+        self._len += 1
+        if self._len > self._mask >> 1:
+            self._grow()
+        return False
+
+    def nbytes(self) -> int:
+        return self._slots.itemsize * len(self._slots)
+
+    def _grow(self) -> None:
+        old = self._slots
+        self._slots = array("q", bytes(16 * len(old)))
+        self._mask = len(self._slots) - 1
+        self._len = 0
+        for digest in old:
+            if digest:
+                self.add(digest)
+
+
+class IdAllocator:
+    """
+    Allocator of deterministic 63-bit integer IDs.
+
+    The ID of a node is derived from its namespace, its content and
+    the number of nodes with the same content allocated before it;
+    re-running the same pipeline thus yields the very same IDs, which
+    can be used to deduplicate or compare the graphs of different
+    runs.  IDs are non-negative and fit in a Neo4j integer property.
+
+    Just the digests of the contents are kept, in a compact hash set,
+    and the number of IDs issued only for the contents seen more than
+    once (e.g. a cell changed back to a previous value).
+    """
+
+    def __init__(self) -> None:
+        self._issued = _DigestSet()  # content digests
+        self._duplicates = dict()  # content digest -> number of IDs issued
+
+    def __call__(self, namespace: str, *content) -> int:
+        """
+        Return a new ID for a node with the given namespace and
+        content (anything with a deterministic repr()).
+        """
+
+        h = blake2b(digest_size=8)
+        h.update(namespace.encode())
+        for chunk in content:
+            h.update(b"\x00")
+            h.update(
+                chunk if isinstance(chunk, bytes) else repr(chunk).encode()
+            )
+        digest = int.from_bytes(h.digest(), "big") >> 1  # 63 bit
+        if not self._issued.add(digest):
+            return digest
+        occurrence = self._duplicates.get(digest, 1)
+        self._duplicates[digest] = occurrence + 1
+        h.update(occurrence.to_bytes(8, "big"))
+        return int.from_bytes(h.digest(), "big") >> 1
+
+    def reset(self) -> None:
+        """Forget the IDs allocated so far"""
+        self._issued = _DigestSet()
+        self._duplicates.clear()
+
+
+#: Allocator used by default by the graph.structure functions
+default_allocator = IdAllocator()
+
+
+def render_id(namespace: str, node_id: int) -> str:
+    """
+    Render an ID as a string, e.g. when exporting nodes outside of
+    Neo4j: "<namespace><16 hexadecimal digits>".
+    """
+
+    return f"{namespace}{node_id:016x}"
+
+
+def parse_id(node_id: Union[int, str]) -> int:
+    """Inverse of render_id(), integer IDs are returned as they are"""
+    if isinstance(node_id, str):
+        for namespace in NAMESPACES:
+            if node_id.startswith(namespace):
+                return int(node_id[len(namespace) :], 16)  # noqa
+        return int(node_id, 16)
+    return int(node_id)
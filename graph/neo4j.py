@@ -33,19 +33,167 @@ from graph.constants import (
     DERIVATION_RELATION,
     ENTITY_CONSTRAINT,
     ENTITY_LABEL,
+    FOLLOWS_RELATION,
     GENERATION_RELATION,
     INVALIDATION_RELATION,
     NEXT_RELATION,
+    RULE_CONSTRAINT,
+    RULE_LABEL,
     USED_RELATION,
+    WRITE_BATCH_SIZE,
 )
+from concurrent.futures import Future, wait
+from functools import partial
+from graph.ids import parse_id
 from logging import debug, error
 from multiprocessing import cpu_count
-from multiprocessing.dummy import Pool
 from neo4j import GraphDatabase, Session
-from typing import List, Optional
+from queue import Queue
+from threading import Thread
+from typing import Callable, List, Optional, Sequence, Union
 from utils import Singleton
 
 
+def _covers(runs: str, labels: str, index: str) -> str:
+    """
+    Return a Cypher predicate telling whether index is in the RowSet
+    runs (see RowSet.to_list()) or in the list of labels, e.g. of the
+    rows covered by a rule or dropped by an activity.
+    """
+
+    return f"""(
+                any(k IN range(0, size(coalesce({runs}, [])) - 1, 2)
+                    WHERE {runs}[k] <= {index}
+                    AND {index} < {runs}[k] + {runs}[k + 1])
+                OR {index} IN coalesce({labels}, [])
+                )"""
+
+
+def nodes_query(label: str) -> str:
+    """
+    Return the query creating a label-ed node with the properties of
+    each one of the $rows.
+    """
+
+    return f"""
+                UNWIND $rows AS row
+                CREATE (n:{label})
+                SET n = row
+                """
+
+
+def column_derivations_query() -> str:
+    """
+    Return the query merging the derivations between the columns
+    of the $rows (see Neo4jQueries.add_derivations_columns()).
+    """
+
+    return (
+        """
+                UNWIND $rows AS row
+                MATCH (c1:"""
+        + COLUMN_LABEL
+        + """ {id: row.gen})
+                WITH c1, row
+                MATCH (c2:"""
+        + COLUMN_LABEL
+        + """ {id: row.used})
+                MERGE (c1)-[:"""
+        + DERIVATION_RELATION
+        + """]->(c2)
+                WITH c1, c2, row
+                WHERE row.rule IS NOT NULL
+                MERGE (r:"""
+        + RULE_LABEL
+        + """ {id: row.rule.id})
+                SET r = row.rule
+                MERGE (c1)-[:"""
+        + FOLLOWS_RELATION
+        + """]->(r)
+                MERGE (r)-[:"""
+        + USED_RELATION
+        + """]->(c2)
+                """
+    )
+
+
+def edges_query(
+    start: str, relation: str, end: str, clause: str = "MERGE"
+) -> str:
+    """
+    Return the query merging (or creating, see clause) a relation from
+    the start-labeled node to the end-labeled node of each one of the
+    $rows, given by their "start" and "end" IDs.
+    """
+
+    return f"""
+                UNWIND $rows AS row
+                MATCH (s:{start} {{id: row.start}})
+                MATCH (e:{end} {{id: row.end}})
+                {clause} (s)-[:{relation}]->(e)
+                """
+
+
+def relation_edges(relations: List[any], label: str) -> List[tuple]:
+    """
+    Flatten the relations (see structure.create_relation()) of all the
+    activities in (start label, relation type, end label, rows) edges,
+    one for each relation type, whose rows have the "start" and "end"
+    IDs of the nodes.
+
+    :param relations: The relations to flatten.
+    :param label: The label of the nodes, i.e. entities or columns.
+    """
+
+    used, generated, invalidated = list(), list(), list()
+    for relation in relations:
+        act_id = relation[4]
+        used.extend({"start": act_id, "end": n} for n in relation[1])
+        generated.extend({"start": n, "end": act_id} for n in relation[0])
+        invalidated.extend(
+            {"start": n, "end": act_id}
+            # invalidated == used when the relation is the "same"
+            for n in (relation[1] if relation[3] else relation[2])
+        )
+    return [
+        (ACTIVITY_LABEL, USED_RELATION, label, used),
+        (label, GENERATION_RELATION, ACTIVITY_LABEL, generated),
+        (label, INVALIDATION_RELATION, ACTIVITY_LABEL, invalidated),
+    ]
+
+
+def _pair(row: dict) -> int:
+    return parse_id(row["start"]) << 64 | parse_id(row["end"])
+
+
+def new_edges(written: set, rows: List[dict]) -> List[dict]:
+    """
+    Return the rows whose ("start", "end") ID pair is not in the
+    written set yet, adding it there; pairs are packed in a single
+    integer to save memory.  The rows which then fail to be written
+    must be passed to forget_edges().
+    """
+
+    ret = list()
+    for row in rows:
+        pair = _pair(row)
+        if pair not in written:
+            written.add(pair)
+            ret.append(row)
+    return ret
+
+
+def forget_edges(written: set, rows: List[dict]) -> None:
+    """
+    Remove the ("start", "end") ID pairs of the rows from the written
+    set, e.g. after failing to write them, so that they are written
+    by the next new_edges() call returning them
+    """
+
+    for row in rows:
+        written.discard(_pair(row))
+
+
 @Singleton
 class Neo4jConnector:
     """
@@ -88,19 +236,132 @@ class Neo4jConnector:
         )
 
 
+class Neo4jWriterPool:
+    """
+    Long-lived pool of writer threads, each one with its own session,
+    started by the first submit() and stopped by close().
+
+    Batches reach the writers through a bounded queue: submit() blocks
+    while queue_size batches are already waiting, thus at most
+    workers + queue_size transactions are in flight.
+
+    :param connector: The Neo4jConnector to use.
+    :param db: The database to write to, the default one if None.
+    :param workers: The number of writers, default cpu_count() - 1.
+    :param queue_size: The number of waiting batches, default twice
+                       the number of writers.
+    """
+
+    def __init__(
+        self,
+        connector,
+        db: str = None,
+        workers: int = None,
+        queue_size: int = None,
+    ) -> None:
+        self.connector = connector
+        self.db = db
+        self.workers = workers or max(1, cpu_count() - 1)
+        self.queue_size = queue_size or 2 * self.workers
+        self._queue = None
+        self._threads = list()
+
+    def submit(self, query: str, parameters: dict) -> Future:
+        """
+        Enqueue a write query, whose result will be None (or whose
+        exception the error of the query or of its session)
+        """
+        if self._queue is None:
+            self._start()
+        future = Future()
+        self._queue.put((query, parameters, future))
+        return future
+
+    def close(self) -> None:
+        """Wait for the enqueued queries and stop the writers"""
+        if self._queue is None:
+            return
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._queue, self._threads = None, list()
+
+    def _start(self) -> None:
+        self._queue = Queue(self.queue_size)
+        self._threads = [
+            Thread(
+                target=self._write,
+                args=(self._queue,),
+                name=f"neo4j-writer-{i}",
+                daemon=True,
+            )
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        debug(f"started {self.workers} Neo4j writers")
+
+    def _write(self, queue: Queue) -> None:
+        try:
+            session = self.connector.create_session(db=self.db)
+        except Exception as e:
+            error(f"Session failed: {e}")
+            # fail the batches instead, lest submit() and close() hang
+            while True:
+                task = queue.get()
+                if task is None:
+                    return
+                task[2].set_exception(e)
+        try:
+            while True:
+                task = queue.get()
+                if task is None:
+                    break
+                query, parameters, future = task
+                try:
+                    session.run(query, parameters).consume()
+                except Exception as e:
+                    error(f"Query failed: {e} {query}")
+                    future.set_exception(e)
+                else:
+                    future.set_result(None)
+        finally:
+            session.close()
+
+
 class Neo4jQueryExecutor:
     """
     Class that executes queries for Neo4j.
+
+    :param connector: The Neo4jConnector to use.
+    :param db: The database of the queries, the default one if None.
+    :param workers: The number of writers of insert_data_multiprocess(),
+                    see Neo4jWriterPool.
+    :param batch_size: The number of rows of each of their batches.
     """
 
-    def __init__(self, connector) -> None:
+    def __init__(
+        self,
+        connector,
+        db: str = None,
+        workers: int = None,
+        batch_size: int = WRITE_BATCH_SIZE,
+    ) -> None:
         self.__connector = connector
+        self.__db = db
+        self.batch_size = batch_size
+        self.writers = Neo4jWriterPool(connector, db, workers)
+
+    def close(self) -> None:
+        """Stop the writers of insert_data_multiprocess(), if any"""
+        self.writers.close()
 
     def write_transaction(self, query: str) -> None:
         def transaction(tx) -> None:
             tx.run(query)
 
-        with self.__connector.create_session(db=None) as session:
+        with self.__connector.create_session(db=self.__db) as session:
             session.write_transaction(transaction)
 
     def write_transaction2(self, query: str, batch_size: int = 500):
@@ -108,7 +369,7 @@ class Neo4jQueryExecutor:
             result = tx.run(query, parameters={"batch_size": batch_size})
             return len(list(result))
 
-        with self.__connector.create_session(db=None) as session:
+        with self.__connector.create_session(db=self.__db) as session:
             while True:
                 result = session.write_transaction(
                     delete_batch,
@@ -135,7 +396,8 @@ class Neo4jQueryExecutor:
 
         :param query: The query to execute.
         :param parameters: Parameters for the query.
-        :param db: The database to connect to.
+        :param db: The database to connect to, if not the one of the
+                   executor.
         :param session: An externally created Neo4j session to use for
                         executing the query.
         :return: The query result as a list or None if an error occurred.
@@ -152,7 +414,9 @@ class Neo4jQueryExecutor:
 
         try:
             if not external_session:
-                session = self.__connector.create_session(db=db)
+                session = self.__connector.create_session(
+                    db=db if db is not None else self.__db
+                )
             response = session.run(query, parameters).data()
         except Exception as e:
             error(f"Query failed: {e} {query}")
@@ -166,50 +430,68 @@ class Neo4jQueryExecutor:
         self,
         query: str,
         rows: List[any],
+        on_failure: Callable[[List[any]], None] = None,
         **kwargs,
     ) -> None:
         """
-        Divides the data into batches. Each batch is assigned to a
-        process that loads it into Neo4j.
-        The method completes when all workers have finished execution.
+        Divides the data into batches of at most batch_size rows,
+        which are loaded into Neo4j by the writers of the executor.
+        The method completes when all the batches have been written,
+        raising the error of the first failed one if any.
 
         :param query: The query to execute.
         :param rows: The rows to load.
+        :param on_failure: If given, called with the rows of each failed
+                           batch (the rows are kept until written).
         :kwargs: Additional parameters to load.
         """
 
-        pool = Pool(processes=(cpu_count() - 1))
-        batch_size = (
-            len(rows) // (cpu_count() - 1)
-            if len(rows) >= cpu_count() - 1
-            else cpu_count()
-        )
-        batch = 0
-
-        while batch * batch_size < len(rows):
-            parameters = {
-                "rows": rows[
-                    batch * batch_size : (batch + 1) * batch_size
-                ]  # noqa
-            }
-            pool.apply_async(
-                self.query,
-                args=(query,),
-                kwds={"parameters": {**parameters, **kwargs}},
-            )
-            batch += 1
+        futures = list()
+        pending = dict()  # future -> rows of its batch, until it succeeds
 
-        pool.close()
-        pool.join()
+        def succeeded(future: Future) -> None:
+            if future.exception() is None:
+                pending.pop(future, None)
+
+        for i in range(0, len(rows), self.batch_size):
+            batch = rows[i : i + self.batch_size]  # noqa
+            future = self.writers.submit(query, {"rows": batch, **kwargs})
+            futures.append(future)
+            if on_failure is not None:
+                pending[future] = batch
+                future.add_done_callback(succeeded)
+        wait(futures)
+        for future in futures:
+            if future in pending:
+                on_failure(pending.pop(future))
+        for future in futures:
+            future.result()  # raise the error of the first failed batch
 
 
 class Neo4jQueries:
     """
     Class containing predefined queries for Neo4j.
+
+    The relations between entities, columns and activities are written
+    with CREATE, which unlike MERGE does not look for an existing edge
+    between each pair of nodes: the edges written so far are kept in a
+    set of ID pairs (packed in a single integer) and skipped when
+    written again.  This assumes that nobody else writes them, i.e.
+    that the database was emptied by delete_all(), otherwise
+    merge_edges restores the safer MERGE.
+
+    :param query_executor: The Neo4jQueryExecutor to use.
+    :param merge_edges: Whether to MERGE the relations.
     """
 
-    def __init__(self, query_executor):
+    def __init__(self, query_executor, merge_edges: bool = False):
         self.__query_executor = query_executor
+        self.merge_edges = merge_edges
+        self.__edges = dict()  # (start, relation, end) -> written pairs
+
+    def close(self) -> None:
+        """Stop the writers of the query executor"""
+        self.__query_executor.close()
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
     def create_constraint(self, session=None) -> None:
@@ -224,6 +506,7 @@ class Neo4jQueries:
             f"DROP CONSTRAINT {ACTIVITY_CONSTRAINT}",
             f"DROP CONSTRAINT {ENTITY_CONSTRAINT}",
             f"DROP CONSTRAINT {COLUMN_CONSTRAINT}",
+            f"DROP CONSTRAINT {RULE_CONSTRAINT}",
         ):
             try:
                 self.__query_executor.query(
@@ -247,6 +530,9 @@ class Neo4jQueries:
             #
             f"CREATE CONSTRAINT {COLUMN_CONSTRAINT} "
             f"FOR (c:{COLUMN_LABEL}) REQUIRE c.id IS UNIQUE",
+            #
+            f"CREATE CONSTRAINT {RULE_CONSTRAINT} "
+            f"FOR (r:{RULE_LABEL}) REQUIRE r.id IS UNIQUE",
         ):
             try:
                 self.__query_executor.query(
@@ -277,6 +563,7 @@ class Neo4jQueries:
         debug(query)
         # self.__query_executor.write_transaction2(query)
         self.__query_executor.query(query, parameters=None, session=session)
+        self.__edges.clear()
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
     def add_activities(self, activities: List[any], session=None) -> None:
@@ -288,37 +575,22 @@ class Neo4jQueries:
                         the query.
         :return: The query result as a list or None if an error occurred.
         """
-        query = (
-            """
-                UNWIND $rows AS row
-                CREATE (a:"""
-            + ACTIVITY_LABEL
-            + """)
-                SET a = row
-                """
-        )
+        query = nodes_query(ACTIVITY_LABEL)
         debug(query)
         self.__query_executor.query(
             query, parameters={"rows": activities}, session=session
         )
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
-    def add_entities(self, entities: List[any]) -> None:
+    def add_entities(self, entities: Sequence[any]) -> None:
         """
         Adds entities to the database.
 
-        :param entities: The entities to add.
+        :param entities: The entities to add, either a list or an
+                         EntityTable (rows are rendered batch by batch).
         :return: None
         """
-        query = (
-            """
-                UNWIND $rows AS row
-                CREATE (e:"""
-            + ENTITY_LABEL
-            + """)
-                SET e=row
-                """
-        )
+        query = nodes_query(ENTITY_LABEL)
         debug(query)
         self.__query_executor.insert_data_multiprocess(
             query=query,
@@ -333,15 +605,7 @@ class Neo4jQueries:
         :param columns: The entities to add.
         :return: None
         """
-        query = (
-            """
-                UNWIND $rows AS row
-                CREATE (c:"""
-            + COLUMN_LABEL
-            + """)
-                SET c=row
-                """
-        )
+        query = nodes_query(COLUMN_LABEL)
         debug(query)
         self.__query_executor.insert_data_multiprocess(
             query=query,
@@ -379,49 +643,26 @@ class Neo4jQueries:
         :param derivations: The derivations to add.
         :return: None
         """
-        query = (
-            """
-                UNWIND $rows AS row
-                MATCH (e1:"""
-            + ENTITY_LABEL
-            + """ {id: row.gen})
-                WITH e1, row
-                MATCH (e2:"""
-            + ENTITY_LABEL
-            + """ {id: row.used})
-                MERGE (e1)-[:"""
-            + DERIVATION_RELATION
-            + """]->(e2)
-                """
-        )
-        debug(query)
-        self.__query_executor.insert_data_multiprocess(
-            query=query,
-            rows=derivations,
+        self._add_edges(
+            ENTITY_LABEL,
+            DERIVATION_RELATION,
+            ENTITY_LABEL,
+            [
+                {"start": derivation["gen"], "end": derivation["used"]}
+                for derivation in derivations
+            ],
         )
 
     def add_derivations_columns(self, derivations: List[any]) -> None:
         """
         Adds derivations (relationships between entities) to the database.
 
-        :param derivations: The derivations to add.
+        :param derivations: The derivations to add, optionally with the
+                            rule (see structure.create_rule()) which
+                            derived the generated column.
         :return: None
         """
-        query = (
-            """
-                UNWIND $rows AS row
-                MATCH (c1:"""
-            + COLUMN_LABEL
-            + """ {id: row.gen})
-                WITH c1, row
-                MATCH (c2:"""
-            + COLUMN_LABEL
-            + """ {id: row.used})
-                MERGE (c1)-[:"""
-            + DERIVATION_RELATION
-            + """]->(c2)
-                """
-        )
+        query = column_derivations_query()
         debug(query)
         self.__query_executor.insert_data_multiprocess(
             query=query,
@@ -435,29 +676,17 @@ class Neo4jQueries:
         :param relations: The derivations to add.
         :return: None
         """
-        for relation in relations:
-            column = relation[0]
-            entities = relation[1]
 
-            query = (
-                """
-                    UNWIND $rows AS row
-                    MATCH (e:"""
-                + ENTITY_LABEL
-                + """ {id: row})
-                    WITH e
-                    MATCH (a:"""
-                + COLUMN_LABEL
-                + """ {id: $column})
-                    MERGE (e)-[:"""
-                + BELONGS_RELATION
-                + """]->(a)
-                    """
-            )
-            debug(query)
-            self.__query_executor.insert_data_multiprocess(
-                query=query, rows=entities, column=column
-            )
+        self._add_edges(
+            ENTITY_LABEL,
+            BELONGS_RELATION,
+            COLUMN_LABEL,
+            [
+                {"start": entity, "end": column}
+                for column, entities in relations
+                for entity in entities
+            ],
+        )
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
     def add_relations(self, relations: List[any]) -> None:
@@ -468,75 +697,7 @@ class Neo4jQueries:
         :param relations: The relations to add.
         :return: None
         """
-        for relation in relations:
-            generated = relation[0]
-            used = relation[1]
-            invalidated = relation[2]
-            same = relation[3]
-            act_id = relation[4]
-
-            if same:
-                invalidated = used
-
-            query1 = (
-                """
-                    UNWIND $rows AS row
-                    MATCH (e:"""
-                + ENTITY_LABEL
-                + """ {id: row})
-                    WITH e
-                    MATCH (a:"""
-                + ACTIVITY_LABEL
-                + """ {id: $act_id})
-                    MERGE (a)-[:"""
-                + USED_RELATION
-                + """]->(e)
-                    """
-            )
-            query2 = (
-                """
-                    UNWIND $rows AS row
-                    MATCH (e:"""
-                + ENTITY_LABEL
-                + """ {id: row})
-                    WITH e
-                    MATCH (a:"""
-                + ACTIVITY_LABEL
-                + """ {id: $act_id})
-                    MERGE (e)-[:"""
-                + GENERATION_RELATION
-                + """]->(a)
-                    """
-            )
-            query3 = (
-                """
-                    UNWIND $rows AS row
-                    MATCH (e:"""
-                + ENTITY_LABEL
-                + """ {id: row})
-                    WITH e
-                    MATCH (a:"""
-                + ACTIVITY_LABEL
-                + """ {id: $act_id})
-                    MERGE (e)-[:"""
-                + INVALIDATION_RELATION
-                + """]->(a)
-                    """
-            )
-
-            debug(query1)
-            debug(query2)
-            debug(query3)
-
-            self.__query_executor.insert_data_multiprocess(
-                query=query1, rows=used, act_id=act_id
-            )
-            self.__query_executor.insert_data_multiprocess(
-                query=query2, rows=generated, act_id=act_id
-            )
-            self.__query_executor.insert_data_multiprocess(
-                query=query3, rows=invalidated, act_id=act_id
-            )
+        self._add_relations(relations, ENTITY_LABEL)
 
     def add_relations_columns(self, relations: List[any]) -> None:
         """
@@ -546,75 +707,41 @@ class Neo4jQueries:
         :param relations: The relations to add.
         :return: None
         """
-        for relation in relations:
-            generated = relation[0]
-            used = relation[1]
-            invalidated = relation[2]
-            same = relation[3]
-            act_id = relation[4]
+        self._add_relations(relations, COLUMN_LABEL)
 
-            if same:
-                invalidated = used
+    def _add_relations(self, relations: List[any], label: str) -> None:
+        """
+        Add the relations of all the activities with a single UNWIND
+        query per relation type (batched by the query executor).
 
-            query1 = (
-                """
-                    UNWIND $rows AS row
-                    MATCH (c:"""
-                + COLUMN_LABEL
-                + """ {id: row})
-                    WITH c
-                    MATCH (a:"""
-                + ACTIVITY_LABEL
-                + """ {id: $act_id})
-                    MERGE (a)-[:"""
-                + USED_RELATION
-                + """]->(c)
-                    """
-            )
-            query2 = (
-                """
-                    UNWIND $rows AS row
-                    MATCH (c:"""
-                + COLUMN_LABEL
-                + """ {id: row})
-                    WITH c
-                    MATCH (a:"""
-                + ACTIVITY_LABEL
-                + """ {id: $act_id})
-                    MERGE (c)-[:"""
-                + GENERATION_RELATION
-                + """]->(a)
-                    """
-            )
-            query3 = (
-                """
-                    UNWIND $rows AS row
-                    MATCH (c:"""
-                + COLUMN_LABEL
-                + """ {id: row})
-                    WITH c
-                    MATCH (a:"""
-                + ACTIVITY_LABEL
-                + """ {id: $act_id})
-                    MERGE (c)-[:"""
-                + INVALIDATION_RELATION
-                + """]->(a)
-                    """
-            )
+        :param relations: The relations to add.
+        :param label: The label of the nodes, i.e. entities or columns.
+        """
 
-            debug(query1)
-            debug(query2)
-            debug(query3)
+        for edges in relation_edges(relations, label):
+            self._add_edges(*edges)
 
-            self.__query_executor.insert_data_multiprocess(
-                query=query1, rows=used, act_id=act_id
-            )
-            self.__query_executor.insert_data_multiprocess(
-                query=query2, rows=generated, act_id=act_id
-            )
-            self.__query_executor.insert_data_multiprocess(
-                query=query3, rows=invalidated, act_id=act_id
-            )
+    def _add_edges(
+        self, start: str, relation: str, end: str, rows: List[dict]
+    ) -> None:
+        """
+        Add the relations from the start-labeled to the end-labeled
+        nodes whose IDs are the "start" and "end" of the rows, with a
+        single UNWIND query (batched by the query executor).
+        """
+
+        on_failure = None
+        if not self.merge_edges:
+            written = self.__edges.setdefault((start, relation, end), set())
+            rows = new_edges(written, rows)
+            on_failure = partial(forget_edges, written)
+        query = edges_query(
+            start, relation, end, "MERGE" if self.merge_edges else "CREATE"
+        )
+        debug(query)
+        self.__query_executor.insert_data_multiprocess(
+            query=query, rows=rows, on_failure=on_failure
+        )
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
     def add_next_operations(
@@ -689,14 +816,12 @@ class Neo4jQueries:
         return self.__query_executor.query(query, session=session)
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
-    def why_provenance(self, entity_id: str, session=None):
+    def why_provenance(self, entity_id: Union[int, str], session=None):
         query = (
             """
                 MATCH (e:"""
             + ENTITY_LABEL
-            + '''{id:"'''
-            + entity_id
-            + """"})-[:"""
+            + """ {id: $id})-[:"""
             + DERIVATION_RELATION
             + """]->(m:"""
             + ENTITY_LABEL
@@ -707,17 +832,17 @@ class Neo4jQueries:
 
         debug(query)
 
-        return self.__query_executor.query(query, session=session)
+        return self.__query_executor.query(
+            query, parameters={"id": parse_id(entity_id)}, session=session
+        )
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
-    def how_provenance(self, entity_id: str, session=None):
+    def how_provenance(self, entity_id: Union[int, str], session=None):
         query = (
             """
                 MATCH (e:"""
             + ENTITY_LABEL
-            + '''{id:"'''
-            + entity_id
-            + """"})-[:"""
+            + """ {id: $id})-[:"""
             + DERIVATION_RELATION
             + """]->(m:"""
             + ENTITY_LABEL
@@ -733,7 +858,9 @@ class Neo4jQueries:
 
         debug(query)
 
-        return self.__query_executor.query(query, session=session)
+        return self.__query_executor.query(
+            query, parameters={"id": parse_id(entity_id)}, session=session
+        )
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
     def dataset_level_feature_operation(self, feature: str, session=None):
@@ -760,31 +887,31 @@ class Neo4jQueries:
         return self.__query_executor.query(query, session=session)
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
-    def item_level_feature_operation(self, entity_id: str, session=None):
+    def item_level_feature_operation(
+        self, entity_id: Union[int, str], session=None
+    ):
         query = (
             """
                 MATCH (e:"""
             + ENTITY_LABEL
-            + '''{id:"'''
-            + entity_id
-            + """"})-[]-(a:"""
+            + """ {id: $id})-[]-(a:"""
             + ACTIVITY_LABEL
             + """)
                 RETURN e,a
                 """
         )
         debug(query)
-        return self.__query_executor.query(query, session=session)
+        return self.__query_executor.query(
+            query, parameters={"id": parse_id(entity_id)}, session=session
+        )
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
-    def item_invalidation(self, entity_id: str, session=None):
+    def item_invalidation(self, entity_id: Union[int, str], session=None):
         query = (
             """
                 MATCH (e:"""
             + ENTITY_LABEL
-            + '''{id:"'''
-            + entity_id
-            + """"})-[:"""
+            + """ {id: $id})-[:"""
             + INVALIDATION_RELATION
             + """]->(a:"""
             + ACTIVITY_LABEL
@@ -795,7 +922,9 @@ class Neo4jQueries:
 
         debug(query)
 
-        return self.__query_executor.query(query, session=session)
+        return self.__query_executor.query(
+            query, parameters={"id": parse_id(entity_id)}, session=session
+        )
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
     def feature_invalidation(self, feature: str, session=None):
@@ -815,6 +944,10 @@ class Neo4jQueries:
                 MATCH (e:{ENTITY_LABEL})-[:{INVALIDATION_RELATION}]->(a:{ACTIVITY_LABEL})
                 WHERE {index} = e.index AND a.deleted_records = true
                 RETURN DISTINCT a
+                UNION
+                MATCH (a:{ACTIVITY_LABEL})
+                WHERE {_covers("a.deleted_rows", "a.deleted_row_labels", index)}
+                RETURN DISTINCT a
         """  # noqa
 
         debug(query)
@@ -834,25 +967,92 @@ class Neo4jQueries:
         return self.__query_executor.query(query, session=session)
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
-    def item_history(self, entity_id: str, session=None):
+    def item_history(self, entity_id: Union[int, str], session=None):
+        """
+        Return the derivations of an entity and, since the cells
+        following a rule (see item_rules()) have no entity of their
+        own, the rules its columns were derived by.
+        """
+
         query = (
             """
                 MATCH p=(e:"""
             + ENTITY_LABEL
-            + '''{id:"'''
-            + entity_id
-            + """"})-[r:"""
+            + """ {id: $id})-[r:"""
             + DERIVATION_RELATION
             + """*1..]-(m:"""
             + ENTITY_LABEL
             + """)
+                RETURN DISTINCT e,r,m
+                UNION
+                MATCH (e:"""
+            + ENTITY_LABEL
+            + """ {id: $id})-[:"""
+            + BELONGS_RELATION
+            + """]->(:"""
+            + COLUMN_LABEL
+            + """)-[:"""
+            + DERIVATION_RELATION
+            + """*0..]->(:"""
+            + COLUMN_LABEL
+            + """)-[:"""
+            + FOLLOWS_RELATION
+            + """]->(r:"""
+            + RULE_LABEL
+            + """)-[:"""
+            + USED_RELATION
+            + """]->(c:"""
+            + COLUMN_LABEL
+            + """)
+                WHERE """
+            + _covers("r.rows", "r.row_labels", "e.index")
+            + """
+                OPTIONAL MATCH (m:"""
+            + ENTITY_LABEL
+            + """ {index: e.index})-[:"""
+            + BELONGS_RELATION
+            + """]->(c)
                 RETURN DISTINCT e,r,m
                 """
         )
 
         debug(query)
 
-        return self.__query_executor.query(query, session=session)
+        return self.__query_executor.query(
+            query, parameters={"id": parse_id(entity_id)}, session=session
+        )
+
+    # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
+    def item_rules(self, feature_name: str, index, session=None):
+        """
+        Expand the rules on demand: return the rules which derived the
+        cell of the given column and index label, each one with the
+        column it used.
+        """
+
+        query = (
+            """
+                MATCH (r:"""
+            + RULE_LABEL
+            + """ {feature_name: $feature_name})-[:"""
+            + USED_RELATION
+            + """]->(c:"""
+            + COLUMN_LABEL
+            + """)
+                WHERE """
+            + _covers("r.rows", "r.row_labels", "$index")
+            + """
+                RETURN r,c
+                """
+        )
+
+        debug(query)
+
+        return self.__query_executor.query(
+            query,
+            parameters={"feature_name": feature_name, "index": index},
+            session=session,
+        )
 
     # @timing(log_file=NEO4j_QUERY_EXECUTION_TIMES)
     def get_random_nodes(self, label: str, limit: int = 3, session=None):
@@ -905,17 +1105,31 @@ class Neo4jFactory:
         pass
 
     @staticmethod
-    def create_neo4j_queries(uri: str, user: str, pwd: str) -> Neo4jQueries:
+    def create_neo4j_queries(
+        uri: str,
+        user: str,
+        pwd: str,
+        db: str = None,
+        workers: int = None,
+        batch_size: int = WRITE_BATCH_SIZE,
+        merge_edges: bool = False,
+    ) -> Neo4jQueries:
         """
         Creates Neo4jQueries object for executing queries on Neo4j.
 
         :param uri: The URI of the Neo4j database.
         :param user: The username for accessing the Neo4j database.
         :param pwd: The password for accessing the Neo4j database.
+        :param db: The database to query, the default one if None.
+        :param workers: The number of concurrent writers.
+        :param batch_size: The number of rows written by each of their
+                           transactions.
+        :param merge_edges: Whether to MERGE the relations, see
+                            Neo4jQueries.
         :return: A Neo4jQueries object.
         """
 
         connector = Neo4jConnector(uri, user, pwd)
-        query_executor = Neo4jQueryExecutor(connector)
-        queries = Neo4jQueries(query_executor)
+        query_executor = Neo4jQueryExecutor(connector, db, workers, batch_size)
+        queries = Neo4jQueries(query_executor, merge_edges)
         return queries
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+from typing import Dict, List, NamedTuple, Tuple, Union
+
+
+class ActivityRecord(NamedTuple):
+    """
+    An activity, as rendered by structure.create_activity(), once it
+    has been diffed (which may add some attributes to it)
+    """
+
+    activity: Dict[str, any]
+    kind = "activity"
+
+
+class EntityRecord(NamedTuple):
+    """An entity, as rendered by structure.create_entity()"""
+
+    entity: Dict[str, any]
+    kind = "entity"
+
+
+class ColumnRecord(NamedTuple):
+    """A column, as rendered by structure.create_column()"""
+
+    column: Dict[str, any]
+    kind = "column"
+
+
+class RelationRecord(NamedTuple):
+    """
+    The relations of an activity, as returned by
+    structure.create_relation() (between the activity and entities)
+    or structure.create_relation_column() (and columns).
+    """
+
+    relation: Tuple[list, list, list, bool, int]
+    columns: bool
+    kind = "relation"
+
+
+class DerivationRecord(NamedTuple):
+    """A {"gen": id, "used": id} derivation of entities or columns"""
+
+    derivation: Dict[str, any]
+    columns: bool
+    kind = "derivation"
+
+
+class MembershipRecord(NamedTuple):
+    """The ids of some entities belonging to a column"""
+
+    column: int
+    entities: List[int]
+    kind = "membership"
+
+
+class KeepRecord(NamedTuple):
+    """The id of an entity kept at granularity level 1 or 2"""
+
+    entity: int
+    kind = "keep"
+
+
+Record = Union[
+    ActivityRecord,
+    EntityRecord,
+    ColumnRecord,
+    RelationRecord,
+    DerivationRecord,
+    MembershipRecord,
+    KeepRecord,
+]
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+from typing import Dict, Iterable, List
+import numpy as np
+import pandas as pd
+
+
+def encode_labels(
+    runs_key: str, labels_key: str, labels: pd.Index
+) -> Dict[str, List]:
+    """
+    Encode a set of index labels as a Neo4j property: integer labels
+    as the runs of a RowSet under runs_key (see RowSet.to_list()), any
+    other label as a plain list under labels_key, whose labels are
+    converted to strings when of different types (Neo4j rejects lists
+    mixing them).
+    """
+
+    if pd.api.types.is_integer_dtype(labels.dtype):
+        return {runs_key: RowSet.from_positions(labels).to_list()}
+    ret = labels.unique().tolist()
+    if labels.dtype == object and len({type(label) for label in ret}) > 1:
+        ret = [str(label) for label in ret]
+    return {labels_key: ret}
+
+
+class RowSet:
+    """
+    Run-length encoded set of integers, e.g. of row positions or of
+    integer index labels: sorted, non-overlapping and non-adjacent
+    runs of consecutive integers, each one stored as its start and
+    its length.
+
+    :param starts: The first integer of each run.
+    :param lengths: The number of integers in each run.
+    """
+
+    __slots__ = ("starts", "lengths")
+
+    def __init__(self, starts=(), lengths=()) -> None:
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+
+    @classmethod
+    def from_positions(cls, positions: Iterable[int]) -> "RowSet":
+        """Encode an iterable of integers, which may be unsorted"""
+        positions = np.unique(np.asarray(positions, dtype=np.int64))
+        if len(positions) == 0:
+            return cls()
+        breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+        starts = positions[np.concatenate(([0], breaks))]
+        ends = positions[np.concatenate((breaks - 1, [len(positions) - 1]))]
+        return cls(starts, ends - starts + 1)
+
+    @classmethod
+    def from_list(cls, runs: List[int]) -> "RowSet":
+        """Inverse of to_list()"""
+        runs = np.asarray(runs, dtype=np.int64).reshape(-1, 2)
+        return cls(runs[:, 0], runs[:, 1])
+
+    def __contains__(self, position: int) -> bool:
+        i = np.searchsorted(self.starts, position, side="right") - 1
+        return bool(i >= 0 and position < self.starts[i] + self.lengths[i])
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, RowSet)
+            and np.array_equal(self.starts, other.starts)
+            and np.array_equal(self.lengths, other.lengths)
+        )
+
+    def __len__(self) -> int:
+        return int(self.lengths.sum())
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_list()})"
+
+    def to_list(self) -> List[int]:
+        """
+        Return the runs as a flat [start, length, start, length, ...]
+        list of integers, which can be stored as a Neo4j property
+        """
+
+        return np.column_stack((self.starts, self.lengths)).ravel().tolist()
+
+    def to_positions(self) -> np.ndarray:
+        """Decode the set, as a sorted array of integers"""
+        if len(self.starts) == 0:
+            return np.empty(0, dtype=np.int64)
+        offsets = np.repeat(
+            self.starts - np.cumsum(self.lengths) + self.lengths, self.lengths
+        )
+        return offsets + np.arange(len(self))
+
+    def union(self, other: "RowSet") -> "RowSet":
+        return RowSet.from_positions(
+            np.concatenate((self.to_positions(), other.to_positions()))
+        )
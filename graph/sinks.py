@@ -0,0 +1,645 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+from abc import ABC, abstractmethod
+from collections import Counter
+from graph.constants import (
+    ACTIVITY_LABEL,
+    BELONGS_RELATION,
+    COLUMN_LABEL,
+    DERIVATION_RELATION,
+    ENTITY_LABEL,
+    FOLLOWS_RELATION,
+    GENERATION_RELATION,
+    INVALIDATION_RELATION,
+    NEXT_RELATION,
+    RULE_LABEL,
+    USED_RELATION,
+)
+from graph.records import (
+    ActivityRecord,
+    ColumnRecord,
+    DerivationRecord,
+    EntityRecord,
+    KeepRecord,
+    MembershipRecord,
+    Record,
+    RelationRecord,
+)
+from logging import debug, info
+from os import makedirs
+from os.path import join as join_path
+from typing import Dict, Iterable, List, Optional, Sequence
+import csv
+import gzip
+import json
+import math
+import numpy as np
+
+#: Records buffered by a sink before writing them
+BATCH_SIZE = 100_000
+
+#: Separator of the elements of the array properties written by CsvSink
+#: (neo4j-admin database import --array-delimiter=U+001F)
+ARRAY_DELIMITER = "\x1f"
+
+
+def _jsonable(value):
+    """json.dumps() fallback for NumPy/Pandas scalars and the like"""
+    if hasattr(value, "item"):
+        return value.item()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=_jsonable)
+
+
+def _csv_type(value) -> Optional[str]:
+    """
+    Return the neo4j-admin import type of a property value, None for
+    missing values; lists of mixed types are stored as JSON strings.
+    """
+
+    if value is None:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return "boolean"
+    if isinstance(value, (int, np.integer)):
+        return "long"
+    if isinstance(value, (float, np.floating)):
+        return "double"
+    if isinstance(value, (list, tuple)):
+        kinds = set(map(_csv_type, value))
+        if not kinds:
+            return "string[]"
+        kind = kinds.pop()
+        if not kinds and kind is not None and not kind.endswith("[]"):
+            return f"{kind}[]"
+    return "string"
+
+
+def _csv_value(value, kind: str) -> str:
+    """Render a property value of the given neo4j-admin import type"""
+    if kind.endswith("[]"):
+        return ARRAY_DELIMITER.join(_csv_value(v, kind[:-2]) for v in value)
+    if kind == "boolean":
+        return "true" if value else "false"
+    if kind == "long":
+        return str(int(value))
+    if kind == "double":
+        value = float(value)
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "Infinity" if value > 0 else "-Infinity"
+        return repr(value)
+    if isinstance(value, (list, tuple, dict)):
+        return _dumps(value)
+    return str(value)
+
+
+class Sink(ABC):
+    """
+    Destination of the provenance records (see graph.records), e.g.
+    yielded by ColumnEntityVision.drain() or MultiVision.drain().
+
+    Records are handed to write() in the order they are produced,
+    i.e. the nodes of each step before its edges; close() then adds
+    the activities which were never diffed together with the NEXT
+    relations between consecutive activities, and flushes the sink.
+    """
+
+    def __init__(self) -> None:
+        self._written_activities = set()
+
+    def __enter__(self) -> "Sink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, records: Iterable[Record]) -> None:
+        for record in records:
+            if isinstance(record, ActivityRecord):
+                self._written_activities.add(record.activity["id"])
+            self._write(record)
+
+    def close(self, activities: Sequence[Dict[str, any]] = ()) -> None:
+        """
+        :param activities: All the activities of the pipeline, in
+                           order of execution.
+        """
+
+        self.write(
+            ActivityRecord(activity)
+            for activity in activities
+            if activity["id"] not in self._written_activities
+        )
+        self._write_next(
+            [
+                {"act_in_id": act_in["id"], "act_out_id": act_out["id"]}
+                for act_in, act_out in zip(activities, activities[1:])
+            ]
+        )
+        self._close()
+
+    @abstractmethod
+    def _write(self, record: Record) -> None:
+        """Write a record"""
+
+    @abstractmethod
+    def _write_next(self, pairs: List[Dict[str, int]]) -> None:
+        """Write the NEXT relations between the given activity IDs"""
+
+    def _close(self) -> None:
+        pass
+
+
+class NullSink(Sink):
+    """
+    Discard the records, just counting them by kind: it measures the
+    provenance capture overhead without any ingestion cost.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.counts = Counter()
+
+    def _write(self, record: Record) -> None:
+        self.counts[record.kind] += 1
+
+    def _write_next(self, pairs: List[Dict[str, int]]) -> None:
+        self.counts["next"] += len(pairs)
+
+    def _close(self) -> None:
+        info(f"provenance records: {dict(self.counts)}")
+
+
+class JsonlSink(Sink):
+    """
+    Write the records to a newline-delimited JSON file, one object per
+    record with its "kind" and its fields; relations are split in
+    their "generated", "used" and "invalidated" IDs and the "activity"
+    ID, and NEXT relations are written as {"kind": "next", ...}.
+
+    :param path: The file to write.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.path = path
+        self._file = open(path, "w")
+
+    def _write(self, record: Record) -> None:
+        if isinstance(record, RelationRecord):
+            generated, used, invalidated, same, act_id = record.relation
+            fields = {
+                "activity": act_id,
+                "generated": generated,
+                "used": used,
+                "invalidated": invalidated,
+                "same": same,
+                "columns": record.columns,
+            }
+        else:
+            fields = record._asdict()
+        self._file.write(_dumps({"kind": record.kind, **fields}) + "\n")
+
+    def _write_next(self, pairs: List[Dict[str, int]]) -> None:
+        for pair in pairs:
+            self._file.write(_dumps({"kind": "next", **pair}) + "\n")
+
+    def _close(self) -> None:
+        self._file.close()
+        debug(f"provenance written to {self.path}")
+
+
+class ParquetSink(Sink):
+    """
+    Write the records as node and edge tables, each one a directory
+    of Parquet files (part-00000.parquet, ...) holding up to
+    batch_size rows:
+
+    - activity (id, attributes), entity (id, feature_name, index,
+      value, type) and column (id, instance, fingerprint, attributes);
+    - derivation (gen, used, columns, rule), generated, used and
+      invalidated (activity, target, columns), belongs (column,
+      entity), keep (entity) and next (act_in_id, act_out_id).
+
+    Attributes, index labels, values and rules are stored as JSON,
+    since their types vary from row to row; pyarrow is required.
+
+    :param path: The directory to write the tables into.
+    :param batch_size: The number of rows of each file.
+    """
+
+    def __init__(self, path: str, batch_size: int = BATCH_SIZE) -> None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("ParquetSink requires pyarrow") from e
+        super().__init__()
+        self._pa = pyarrow
+        self.path = path
+        self.batch_size = batch_size
+        self._tables = dict()  # name -> buffered rows
+        self._parts = Counter()  # name -> files written
+
+    def _write(self, record: Record) -> None:
+        if isinstance(record, ActivityRecord):
+            activity = dict(record.activity)
+            self._add("activity", id=activity.pop("id"), attributes=activity)
+        elif isinstance(record, EntityRecord):
+            entity = record.entity
+            self._add(
+                "entity",
+                id=entity["id"],
+                feature_name=str(entity["feature_name"]),
+                index=_dumps(entity["index"]),
+                value=_dumps(entity["value"]),
+                type=entity["type"],
+            )
+        elif isinstance(record, ColumnRecord):
+            column = dict(record.column)
+            self._add(
+                "column",
+                id=column.pop("id"),
+                instance=_dumps(column.pop("instance")),
+                fingerprint=column.pop("fingerprint", None),
+                attributes=column,
+            )
+        elif isinstance(record, DerivationRecord):
+            derivation = record.derivation
+            self._add(
+                "derivation",
+                gen=derivation["gen"],
+                used=derivation["used"],
+                columns=record.columns,
+                rule=derivation.get("rule", None),
+            )
+        elif isinstance(record, RelationRecord):
+            generated, used, invalidated, same, act_id = record.relation
+            if same:
+                invalidated = used
+            for name, targets in (
+                ("generated", generated),
+                ("used", used),
+                ("invalidated", invalidated),
+            ):
+                for target in targets:
+                    self._add(
+                        name,
+                        activity=act_id,
+                        target=target,
+                        columns=record.columns,
+                    )
+        elif isinstance(record, MembershipRecord):
+            for entity in record.entities:
+                self._add("belongs", column=record.column, entity=entity)
+        elif isinstance(record, KeepRecord):
+            self._add("keep", entity=record.entity)
+
+    def _write_next(self, pairs: List[Dict[str, int]]) -> None:
+        for pair in pairs:
+            self._add("next", **pair)
+
+    def _close(self) -> None:
+        for name in list(self._tables):
+            self._flush(name)
+        debug(f"provenance written to {self.path}")
+
+    def _add(self, table: str, **row) -> None:
+        for key in ("attributes", "rule"):
+            if key in row and row[key] is not None:
+                row[key] = _dumps(row[key])
+        rows = self._tables.setdefault(table, list())
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self._flush(table)
+
+    def _flush(self, table: str) -> None:
+        rows = self._tables.pop(table, None)
+        if not rows:
+            return
+        directory = join_path(self.path, table)
+        makedirs(directory, exist_ok=True)
+        self._pa.parquet.write_table(
+            self._pa.Table.from_pylist(rows),
+            join_path(directory, f"part-{self._parts[table]:05d}.parquet"),
+        )
+        self._parts[table] += 1
+
+
+class CsvSink(Sink):
+    """
+    Write the records as the CSV files read by "neo4j-admin database
+    import full" (see make neo4j-import), i.e. the fastest way to load
+    a large provenance graph into an empty database.
+
+    Nodes are written to <label>.nodes.<n>.csv, one file for each
+    label and set of (typed) properties, with their "id" in the ID
+    space of the label; relations are written to
+    <type>.relationships.<n>.csv, one file for each type and labels
+    of their start and end nodes, skipping the duplicated ones.
+    Missing properties are left empty and array elements are joined
+    by ARRAY_DELIMITER, IDs are integers (--id-type=integer).
+
+    :param path: The directory to write the files into.
+    :param compress: Whether to gzip the files (.csv.gz).
+    :param keep_only: Whether to write just the kept entities, which
+                      are thus buffered until close().
+    """
+
+    def __init__(
+        self, path: str, compress: bool = False, keep_only: bool = False
+    ) -> None:
+        super().__init__()
+        self.path = path
+        self.compress = compress
+        self.keep_only = keep_only
+        self._files = dict()  # (label or type, header) -> (file, writer)
+        self._counts = Counter()  # label or type -> files
+        self._edges = dict()  # (type, start, end) -> written ID pairs
+        self._entities, self._keep = list(), set()
+        makedirs(path, exist_ok=True)
+
+    def _write(self, record: Record) -> None:
+        if isinstance(record, ActivityRecord):
+            self._node(ACTIVITY_LABEL, record.activity)
+        elif isinstance(record, EntityRecord):
+            if self.keep_only:
+                self._entities.append(record.entity)
+            else:
+                self._node(ENTITY_LABEL, record.entity)
+        elif isinstance(record, ColumnRecord):
+            self._node(COLUMN_LABEL, record.column)
+        elif isinstance(record, DerivationRecord):
+            derivation = record.derivation
+            label = COLUMN_LABEL if record.columns else ENTITY_LABEL
+            self._edge(
+                DERIVATION_RELATION,
+                (label, derivation["gen"]),
+                (label, derivation["used"]),
+            )
+            rule = derivation.get("rule", None)
+            if rule is not None:
+                self._node(RULE_LABEL, rule)
+                self._edge(
+                    FOLLOWS_RELATION,
+                    (label, derivation["gen"]),
+                    (RULE_LABEL, rule["id"]),
+                )
+                self._edge(
+                    USED_RELATION,
+                    (RULE_LABEL, rule["id"]),
+                    (label, derivation["used"]),
+                )
+        elif isinstance(record, RelationRecord):
+            generated, used, invalidated, same, act_id = record.relation
+            if same:
+                invalidated = used
+            label = COLUMN_LABEL if record.columns else ENTITY_LABEL
+            activity = (ACTIVITY_LABEL, act_id)
+            for target in used:
+                self._edge(USED_RELATION, activity, (label, target))
+            for target in generated:
+                self._edge(GENERATION_RELATION, (label, target), activity)
+            for target in invalidated:
+                self._edge(INVALIDATION_RELATION, (label, target), activity)
+        elif isinstance(record, MembershipRecord):
+            for entity in record.entities:
+                self._edge(
+                    BELONGS_RELATION,
+                    (ENTITY_LABEL, entity),
+                    (COLUMN_LABEL, record.column),
+                )
+        elif isinstance(record, KeepRecord):
+            self._keep.add(record.entity)
+
+    def _write_next(self, pairs: List[Dict[str, int]]) -> None:
+        for pair in pairs:
+            self._edge(
+                NEXT_RELATION,
+                (ACTIVITY_LABEL, pair["act_in_id"]),
+                (ACTIVITY_LABEL, pair["act_out_id"]),
+            )
+
+    def _close(self) -> None:
+        for entity in self._entities:
+            if entity["id"] in self._keep:
+                self._node(ENTITY_LABEL, entity)
+        self._entities.clear()
+        for file, _ in self._files.values():
+            file.close()
+        self._files.clear()
+        debug(f"neo4j-admin import files written to {self.path}")
+
+    def _node(self, label: str, properties: Dict[str, any]) -> None:
+        properties = [
+            (key, value, kind)
+            for key, value in properties.items()
+            for kind in (_csv_type(value),)
+            if kind is not None
+        ]
+        header = tuple(
+            f"id:ID({label})" if key == "id" else f"{key}:{kind}"
+            for key, _, kind in properties
+        )
+        self._writer(label, "nodes", header).writerow(
+            [_csv_value(value, kind) for _, value, kind in properties]
+        )
+
+    def _edge(self, relation: str, start: tuple, end: tuple) -> None:
+        written = self._edges.setdefault((relation, start[0], end[0]), set())
+        pair = start[1] << 64 | end[1]
+        if pair in written:
+            return
+        written.add(pair)
+        header = (f":START_ID({start[0]})", f":END_ID({end[0]})")
+        self._writer(relation, "relationships", header).writerow(
+            (start[1], end[1])
+        )
+
+    def _writer(self, name: str, kind: str, header: tuple):
+        """Return the CSV writer of the file with the given header"""
+        key = (name, header)
+        if key not in self._files:
+            filename = join_path(
+                self.path,
+                f"{name}.{kind}.{self._counts[name]}.csv"
+                + (".gz" if self.compress else ""),
+            )
+            self._counts[name] += 1
+            file = (
+                gzip.open(filename, "wt", newline="", compresslevel=1)
+                if self.compress
+                else open(filename, "w", newline="")
+            )
+            self._files[key] = (file, csv.writer(file))
+            self._files[key][1].writerow(header)
+        return self._files[key][1]
+
+
+class Neo4jSink(Sink):
+    """
+    Write the records to Neo4j through the given Neo4jQueries, batch
+    by batch: the nodes of a batch are always written before its
+    edges.
+
+    At granularity level 1 only the kept entities are written, thus
+    everything is buffered until close().
+
+    :param neo4j: The Neo4jQueries to use.
+    :param session: An optional Neo4j session.
+    :param keep_only: Whether to write just the kept entities.
+    :param batch_size: The number of records of each batch.
+    """
+
+    def __init__(
+        self,
+        neo4j,
+        session=None,
+        keep_only: bool = False,
+        batch_size: int = BATCH_SIZE,
+    ) -> None:
+        super().__init__()
+        self.neo4j = neo4j
+        self.session = session
+        self.keep_only = keep_only
+        self.batch_size = batch_size
+        self._buffered = 0
+        self._records = {
+            kind: list()
+            for kind in (
+                "activity",
+                "column",
+                "entity",
+                "derivation",
+                "derivation_column",
+                "relation",
+                "relation_column",
+                "membership",
+                "keep",
+            )
+        }
+        neo4j.create_constraint(session=session)
+
+    def _write(self, record: Record) -> None:
+        kind = record.kind
+        if isinstance(record, (DerivationRecord, RelationRecord)):
+            kind += "_column" if record.columns else ""
+        self._records[kind].append(
+            list(record) if isinstance(record, MembershipRecord) else record[0]
+        )
+        self._buffered += 1
+        if self._buffered >= self.batch_size and not self.keep_only:
+            self._flush()
+
+    def _write_next(self, pairs: List[Dict[str, int]]) -> None:
+        self._flush()
+        self.neo4j.add_next_operations(pairs)
+
+    def _flush(self) -> None:
+        records, neo4j = self._records, self.neo4j
+        if records["activity"]:
+            neo4j.add_activities(records["activity"], self.session)
+        if records["column"]:
+            neo4j.add_columns(records["column"])
+        self._keep_only()
+        if records["entity"]:
+            neo4j.add_entities(records["entity"])
+        if records["derivation"]:
+            neo4j.add_derivations(records["derivation"])
+        if records["relation"]:
+            neo4j.add_relations(records["relation"])
+        if records["relation_column"]:
+            neo4j.add_relations_columns(records["relation_column"])
+        if records["derivation_column"]:
+            neo4j.add_derivations_columns(records["derivation_column"])
+        if records["membership"]:
+            neo4j.add_relation_entities_to_column(records["membership"])
+        for rows in records.values():
+            rows.clear()
+        self._buffered = 0
+
+    def _keep_only(self) -> None:
+        """Drop the buffered entities which are not kept, if needed"""
+        if self.keep_only:
+            keep = set(self._records["keep"])
+            self._records["entity"] = [
+                entity
+                for entity in self._records["entity"]
+                if entity["id"] in keep
+            ]
+
+    def _close(self) -> None:
+        self.neo4j.close()
+
+
+class AsyncNeo4jSink(Neo4jSink):
+    """
+    Write the records to Neo4j through the given AsyncNeo4jWriter,
+    which ingests a batch while the next one is extracted; the given
+    Neo4jQueries are used just to create the constraints.
+
+    :param neo4j: The Neo4jQueries to use.
+    :param writer: The AsyncNeo4jWriter to use.
+    :param keep_only: Whether to write just the kept entities.
+    :param batch_size: The number of records of each batch.
+    """
+
+    def __init__(
+        self,
+        neo4j,
+        writer,
+        keep_only: bool = False,
+        batch_size: int = BATCH_SIZE,
+    ) -> None:
+        super().__init__(neo4j, None, keep_only, batch_size)
+        self.writer = writer
+
+    def _write_next(self, pairs: List[Dict[str, int]]) -> None:
+        self._flush()
+        self.writer.write({"next": pairs})
+
+    def _flush(self) -> None:
+        self._keep_only()
+        self._records.pop("keep")
+        self.writer.write(self._records)
+        # the written lists are in flight, thus they are replaced
+        self._records = {kind: list() for kind in self._records}
+        self._records["keep"] = list()
+        self._buffered = 0
+
+    def _close(self) -> None:
+        try:
+            self.writer.close()
+        finally:
+            super()._close()
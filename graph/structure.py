@@ -30,8 +30,11 @@ from graph.constants import (
     NAMESPACE_TRACKER,
     NAMESPACE_ENTITY,
     NAMESPACE_COLUMN,
+    NAMESPACE_RULE,
 )
-import uuid
+from graph.ids import IdAllocator, default_allocator
+from graph.rowsets import encode_labels
+import pandas as pd
 
 
 def create_activity(
@@ -48,6 +51,7 @@ def create_activity(
     code_line: str = None,
     tracker_id: str = None,
     exception_text: str = None,
+    ids: IdAllocator = None,
 ) -> str:
     """
     Create a provenance activity and add it to the current activities list.
@@ -64,10 +68,15 @@ def create_activity(
     :param code: The code of the activity.
     :param code_line: The code line of the activity.
     :param tracker_id: The tracker ID.
+    :param ids: The IdAllocator to use, the default one if None.
     :return: The ID of the new provenance activity.
     """
 
-    act_id = NAMESPACE_ACTIVITY + str(uuid.uuid4())
+    # the context is written by the LLM, thus it is not part of the ID
+    # which would not be reproducible across runs
+    act_id = (ids or default_allocator)(
+        NAMESPACE_ACTIVITY, function_name, code, code_line
+    )
 
     attributes = {
         "code": code,
@@ -99,7 +108,11 @@ def create_activity(
 
 
 def create_entity(
-    value, feature_name: str, index: int, instance: str = None
+    value,
+    feature_name: str,
+    index: int,
+    instance: str = None,
+    ids: IdAllocator = None,
 ) -> Dict[str, any]:
     """
     Create a provenance entity.
@@ -109,11 +122,14 @@ def create_entity(
     :param feature_name: The feature name of the entity.
     :param index: The index of the entity.
     :param instance: The instance of the entity.
+    :param ids: The IdAllocator to use, the default one if None.
     :return: A dictionary with the ID and the record ID of the entity.
     """
 
     entity = {
-        "id": NAMESPACE_ENTITY + str(uuid.uuid4()),
+        "id": (ids or default_allocator)(
+            NAMESPACE_ENTITY, feature_name, index, value
+        ),
         "value": value,
         "type": type(value).__name__,
         "feature_name": feature_name,
@@ -124,25 +140,80 @@ def create_entity(
     return entity
 
 
-def create_column(value, index, instance: str = None) -> Dict[str, any]:
+def create_column(
+    value,
+    index,
+    instance: str = None,
+    fingerprint: str = None,
+    ids: IdAllocator = None,
+) -> Dict[str, any]:
     """
     Create a provenance entity.
     Return a dictionary with the ID and the record ID of the entity.
 
     :param value: The value of the entity.
+    :param fingerprint: The hash of the values and index of the column.
+    :param ids: The IdAllocator to use, the default one if None.
     :return: A dictionary with the ID and the record ID of the entity.
     """
 
     column = {
-        "id": NAMESPACE_COLUMN + str(uuid.uuid4()),
+        "id": (ids or default_allocator)(
+            NAMESPACE_COLUMN, instance, fingerprint or (value, index)
+        ),
         "value": value,
         "index": index,
         "instance": instance or list(),
     }
+    if fingerprint is not None:
+        column["fingerprint"] = fingerprint
 
     return column
 
 
+def create_rule(
+    transformation: str,
+    feature_name: str,
+    rows: pd.Index,
+    exceptions: pd.Index,
+    dtype: str = None,
+    mapping: str = None,
+    ids: IdAllocator = None,
+) -> Dict[str, any]:
+    """
+    Create a provenance rule, i.e. the transformation which derived
+    the cells of a column from the ones of its previous version.
+
+    Integer index labels are stored run-length encoded (see
+    RowSet.to_list()) as "rows" and "exceptions", any other label as
+    the "row_labels" and "exception_labels" lists.
+
+    :param transformation: The kind of transformation (cast, strip, map).
+    :param feature_name: The feature name of the derived column.
+    :param rows: The index labels of the cells following the rule.
+    :param exceptions: The index labels of the changed cells not
+                       following the rule, which have their own entities.
+    :param dtype: The dtype the cells were cast to.
+    :param mapping: The repr() of the mapping applied to the cells.
+    :param ids: The IdAllocator to use, the default one if None.
+    :return: A dictionary with the ID and the attributes of the rule.
+    """
+
+    rule = {
+        "id": (ids or default_allocator)(
+            NAMESPACE_RULE, feature_name, transformation, dtype, mapping
+        ),
+        "transformation": transformation,
+        "feature_name": feature_name,
+        "dtype": dtype,
+        "mapping": mapping,
+    }
+    rule.update(encode_labels("rows", "row_labels", rows))
+    rule.update(encode_labels("exceptions", "exception_labels", exceptions))
+
+    return rule
+
+
 def create_relation(
     act_id: str,
     generated: List[any] = None,
@@ -25,7 +25,16 @@
 # along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
 
 
+from graph.async_neo4j import AsyncNeo4jWriter
 from graph.neo4j import Neo4jConnector, Neo4jFactory
+from graph.sinks import (
+    AsyncNeo4jSink,
+    CsvSink,
+    JsonlSink,
+    Neo4jSink,
+    NullSink,
+    ParquetSink,
+)
 from graph.structure import create_activity
 from LLM.LLM_activities_descriptor import LLM_activities_descriptor
 from LLM.LLM_formatter import LLM_formatter
@@ -35,9 +44,14 @@ from os.path import abspath, basename, getsize, isfile, lexists
 from SECRET import black_magic  # from functools import lru_cache
 from SECRET import MY_NEO4J_PASSWORD, MY_NEO4J_USERNAME
 from traceback import format_exception
-from tracking.column_approach import column_vision
-from tracking.column_entity_approach import column_entitiy_vision
+from tracking.archive import load_archive, save_archive
 from tracking.tracking import ProvenanceTracker
+from tracking.variants import (
+    MultiVision,
+    variant_args,
+    variant_of,
+    variant_path,
+)
 from utils import (
     foreign_modules,
     initialize_logging,
@@ -49,73 +63,6 @@ import extracted_code
 import importlib
 
 
-def add_to_neo4j(
-    neo4j,
-    session,
-    cli_args,
-    current_activities,
-    current_entities,
-    current_columns,
-    current_relations,
-    current_relations_column,
-    derivations,
-    derivations_column,
-    current_columns_to_entities,
-    entities_to_keep,
-):
-    """
-    Add activities, entities, derivations, and relations to Neo4j
-
-    Args:
-        neo4j: Neo4j instance.
-        session: Neo4j session.
-        cli_args: Command line arguments.
-        current_activities: List of current activities.
-        current_entities: Dictionary of current entities.
-        current_columns: Dictionary of current columns.
-        derivations: List of derivations.
-        current_relations: List of current relations.
-        current_relations_column: List of current relations columns.
-        derivations_column: List of derivations columns.
-        current_columns_to_entities: Dictionary of current columns to entities.
-        entities_to_keep: List of entities to keep.
-    """
-    # Create constraints in Neo4j
-    neo4j.create_constraint(session=session)
-
-    # Add activities, entities, derivations, and relations to the Neo4j Graph
-    neo4j.add_activities(current_activities, session)
-    if cli_args.granularity_level == 1:
-        filtered_list = [
-            entity
-            for entity in current_entities.values()
-            if entity["id"] in entities_to_keep
-        ]
-        neo4j.add_entities(filtered_list)
-    else:
-        neo4j.add_entities(list(current_entities.values()))
-    neo4j.add_columns(list(current_columns.values()))
-    neo4j.add_derivations(derivations)
-    neo4j.add_relations(current_relations)
-    neo4j.add_relations_columns(current_relations_column)
-    neo4j.add_derivations_columns(derivations_column)
-
-    relations = [
-        [act, current_columns_to_entities[act]]
-        for act in current_columns_to_entities.keys()
-    ]
-    neo4j.add_relation_entities_to_column(relations)
-
-    pairs = [
-        {
-            "act_in_id": current_activities[i]["id"],
-            "act_out_id": current_activities[i + 1]["id"],
-        }
-        for i in range(len(current_activities) - 1)
-    ]
-    neo4j.add_next_operations(pairs)
-
-
 def get_current_activities(
     activities_descr_list, exception_text, activity_tracking=list()
 ):
@@ -174,8 +121,19 @@ initialize_logging(
     debug_mode=parsed_args().verbose,
 )
 debug(f"{cli_args=}")
+assert not (
+    cli_args.streaming and cli_args.save_archive
+), "--streaming forgets the snapshots to be saved by --save-archive"
+
+# a snapshot archive replaces the pipeline, its formatting and the LLMs
+archive = load_archive(cli_args.replay) if cli_args.replay else None
+used_columns_answers = (
+    archive["used_columns_answers"] if archive is not None else dict()
+)
 
-if (
+if archive is not None:
+    extracted_file = None
+elif (
     cli_args.formatted_pipeline is None
     or not isfile(cli_args.formatted_pipeline)
     or getsize(cli_args.formatted_pipeline) == 0
@@ -190,7 +148,9 @@ if (
 else:
     extracted_file = cli_args.formatted_pipeline
 
-if (
+if archive is not None:
+    activities_descr_list = archive["activities"]
+elif (
     cli_args.pipeline_description is None
     or not isfile(cli_args.pipeline_description)
     or getsize(cli_args.pipeline_description) == 0
@@ -205,12 +165,70 @@ else:
     activities_descr_list = yaml_load(cli_args.pipeline_description)
 
 
-# Neo4j initialization
-neo4j = Neo4jFactory.create_neo4j_queries(
-    uri="bolt://localhost", user=MY_NEO4J_USERNAME, pwd=MY_NEO4J_PASSWORD
+# the extracted variants: the one selected by -e/-c/-g, then the ones
+# of --extract, all computed by a single pass over the snapshots
+variants = [variant_of(cli_args)]
+variants.extend(
+    variant
+    for variant in dict.fromkeys(cli_args.variants or ())
+    if variant not in variants
 )
-neo4j.delete_all()
-session = Neo4jConnector().create_session()
+debug(f"{variants=}")
+
+# Sinks initialization, i.e. where the provenance of each variant is
+# written; the additional variants are written to their own files (see
+# --extract, which the Neo4j sinks do not support)
+session = None
+sinks = dict()
+for variant in variants:
+    namespace = variant if variant != variants[0] else None
+    keep_only = variant_args(cli_args, variant).granularity_level == 1
+    if cli_args.sink in ("csv", "csv.gz"):
+        path = cli_args.sink_path or "provenance-csv"
+        sinks[variant] = CsvSink(
+            variant_path(path, namespace) if namespace else path,
+            compress=cli_args.sink == "csv.gz",
+            keep_only=keep_only,
+        )
+    elif cli_args.sink == "jsonl":
+        path = cli_args.sink_path or "provenance.jsonl"
+        sinks[variant] = JsonlSink(
+            variant_path(path, namespace) if namespace else path
+        )
+    elif cli_args.sink == "parquet":
+        path = cli_args.sink_path or "provenance"
+        sinks[variant] = ParquetSink(
+            variant_path(path, namespace) if namespace else path
+        )
+    elif cli_args.sink == "null":
+        sinks[variant] = NullSink()
+    else:
+        # Neo4j initialization
+        neo4j = Neo4jFactory.create_neo4j_queries(
+            uri="bolt://localhost",
+            user=MY_NEO4J_USERNAME,
+            pwd=MY_NEO4J_PASSWORD,
+            workers=cli_args.neo4j_writers,
+            batch_size=cli_args.neo4j_batch_size,
+            merge_edges=cli_args.merge_edges,
+        )
+        neo4j.delete_all()
+        if cli_args.sink == "neo4j-async":
+            sinks[variant] = AsyncNeo4jSink(
+                neo4j,
+                AsyncNeo4jWriter(
+                    uri="bolt://localhost",
+                    user=MY_NEO4J_USERNAME,
+                    pwd=MY_NEO4J_PASSWORD,
+                    concurrency=cli_args.neo4j_writers,
+                    batch_size=cli_args.neo4j_batch_size,
+                    merge_edges=cli_args.merge_edges,
+                ),
+                keep_only=keep_only,
+            )
+        else:
+            session = Neo4jConnector().create_session()
+            sinks[variant] = Neo4jSink(neo4j, session, keep_only=keep_only)
 
 pipeline_name = f"{basename(cli_args.dataset.name).split('.')[0]}__" + str(
     "original"
@@ -223,12 +241,39 @@ pipeline_name = f"{basename(cli_args.dataset.name).split('.')[0]}__" + str(
 )
 debug(f"{pipeline_name=}")
 
+vision = None
+if cli_args.streaming and archive is None:
+    # provenance is extracted while the pipeline runs, i.e. each
+    # tracker.analyze_changes(df) is diffed as soon as it returns
+    current_activities = get_current_activities(activities_descr_list, " ")
+    vision = MultiVision(
+        current_activities, cli_args, variants, used_columns_answers
+    )
+
+
+def write_step(act, df_before, df_after, row_ids=None):
+    vision.step(act, df_before, df_after, row_ids)
+    for variant, sink in sinks.items():
+        sink.write(vision.drain(variant))
+
+
 tracker = ProvenanceTracker(
     save_on_neo4j=True,
+    memory_budget=(
+        cli_args.memory_budget * 2**20
+        if cli_args.memory_budget is not None
+        else None
+    ),
+    spill_dir=cli_args.spill_dir,
+    on_change=write_step if vision is not None else None,
+    copy_on_write=cli_args.copy_on_write,
 )
 
-# running the preprocessing pipeline
-exception, changes = wrapper_run_pipeline(cli_args, tracker)
+if archive is not None:
+    exception, changes = archive["exception_text"], archive["changes"]
+else:
+    # running the preprocessing pipeline
+    exception, changes = wrapper_run_pipeline(cli_args, tracker)
 
 if not changes:  # dict of all the dfs before/after operations
     warning(
@@ -238,40 +283,29 @@ else:
     debug(f"changes={changes!r}")
 
 try:
-    current_activities = get_current_activities(
-        activities_descr_list, exception
-    )
-
-    (
-        current_entities,
-        current_columns,
-        current_relations,
-        current_relations_column,
-        derivations,
-        derivations_column,
-        current_columns_to_entities,
-        entities_to_keep,
-    ) = (
-        column_entitiy_vision(changes, current_activities, cli_args)
-        if cli_args.prov_entity_level
-        else column_vision(changes, current_activities, cli_args)
-    )
-
-    add_to_neo4j(
-        neo4j,
-        session,
-        cli_args,
-        #
-        current_activities,
-        #
-        current_entities,
-        current_columns,
-        current_relations,
-        current_relations_column,
-        derivations,
-        derivations_column,
-        current_columns_to_entities,
-        entities_to_keep,
-    )
+    if vision is None:
+        current_activities = get_current_activities(
+            activities_descr_list, exception
+        )
+        vision = MultiVision(
+            current_activities, cli_args, variants, used_columns_answers
+        )
+        for act in changes.keys():
+            if act == 0:
+                continue
+            step = changes[act]  # materialize the snapshots just once
+            write_step(act, step["before"], step["after"], step.get("row_ids"))
+    vision.close()
+    for variant, sink in sinks.items():
+        sink.close(vision.activities(variant))
+    if cli_args.save_archive is not None:
+        save_archive(
+            cli_args.save_archive,
+            changes,
+            activities_descr_list,
+            exception,
+            used_columns_answers,
+        )
 finally:
-    session.close()
+    if session is not None:
+        session.close()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from ast import literal_eval
+from concurrent.futures import ThreadPoolExecutor
+from tracking.diff import changed_mask, FrameDiff, PARALLEL_MIN_ROWS
+import numpy as np
+import pandas as pd
+
+
+def test_changed_mask_numeric():
+    old = np.array([1.0, np.nan, 3.0, np.nan])
+    new = np.array([1.0, np.nan, 4.0, 5.0])
+    assert changed_mask(old, new).tolist() == [False, False, True, True]
+
+
+def test_changed_mask_objects():
+    old = np.array(["a", None, "c", 1], dtype=object)
+    new = np.array(["a", np.nan, "d", "1"], dtype=object)
+    assert changed_mask(old, new).tolist() == [False, False, True, True]
+
+
+def test_changed_mask_mixed_dtypes():
+    old = np.array([1, 2, 3])
+    new = np.array(["1", "2", "3"], dtype=object)
+    assert changed_mask(old, new).all()
+
+
+def test_frame_diff_rows_and_columns():
+    df1 = pd.DataFrame({"a": [1, 2, 3], "b": [4, 5, 6]})
+    df2 = pd.DataFrame({"a": [1, 9], "c": [0, 0]}, index=[0, 2])
+    diff = FrameDiff(df1, df2)
+
+    assert diff.dropped_columns == ["b"]
+    assert diff.new_columns == ["c"]
+    assert diff.common_columns == ["a"]
+    assert diff.dropped_rows.tolist() == [1]
+    assert diff.new_rows.tolist() == []
+    positions, old_positions = diff.changed_cells("a")
+    assert positions.tolist() == [1]
+    assert old_positions.tolist() == [2]
+
+
+def test_frame_diff_row_ids():
+    df1 = pd.DataFrame({"a": [1, 2, 3]})
+    df2 = pd.DataFrame({"a": [3, 2]})  # relabeled rows
+    diff = FrameDiff(df1, df2, row_ids=(np.arange(3), np.array([2, 1])))
+
+    assert diff.row_positions.tolist() == [2, 1]
+    assert diff.dropped_rows.tolist() == [0]
+    assert diff.changed_cells("a")[0].tolist() == []
+
+
+def test_transformation_cast():
+    df1 = pd.DataFrame({"a": np.arange(20)})
+    df2 = df1.astype({"a": str})
+    ret = FrameDiff(df1, df2).transformation("a")
+
+    assert ret["transformation"] == "cast"
+    assert ret["dtype"] == str(df2["a"].dtype)
+    assert not ret["exceptions"].any()
+
+
+def test_transformation_strip_with_exceptions():
+    values = [f" v{i} " for i in range(20)]
+    df1 = pd.DataFrame({"s": values}, dtype=object)
+    df2 = pd.DataFrame({"s": [v.strip() for v in values]}, dtype=object)
+    df2.loc[3, "s"] = "other"
+    ret = FrameDiff(df1, df2).transformation("s", tolerance=0.1)
+
+    assert ret["transformation"] == "strip"
+    assert np.flatnonzero(ret["exceptions"]).tolist() == [3]
+
+
+def test_transformation_map():
+    df1 = pd.DataFrame({"g": ["m", "f"] * 10}, dtype=object)
+    df2 = df1.replace({"g": {"m": "male", "f": "female"}})
+    ret = FrameDiff(df1, df2).transformation("g")
+
+    assert ret["transformation"] == "map"
+    assert literal_eval(ret["mapping"]) == {"m": "male", "f": "female"}
+
+
+def test_transformation_none():
+    rng = np.random.default_rng(0)
+    df1 = pd.DataFrame({"a": rng.random(20)})
+    df2 = pd.DataFrame({"a": rng.random(20)})
+    assert FrameDiff(df1, df2).transformation("a") is None
+
+
+def test_frame_diff_parallel_matches_serial():
+    rng = np.random.default_rng(0)
+    n = 2 * PARALLEL_MIN_ROWS
+    df1 = pd.DataFrame(
+        {"a": rng.random(n), "b": rng.integers(0, 9, n), "c": ["x"] * n}
+    )
+    df2 = df1.sample(frac=0.9, random_state=0)
+    df2.loc[df2.index[::7], "a"] = np.nan
+    df2.loc[df2.index[::5], "b"] += 1
+    serial = FrameDiff(df1, df2)
+    with ThreadPoolExecutor(2) as executor:
+        parallel = FrameDiff(df1, df2, executor)
+        assert set(parallel._pending) == {"a", "b"}
+        for col in ("a", "b", "c"):
+            for got, expected in zip(
+                parallel.changed_cells(col), serial.changed_cells(col)
+            ):
+                assert got.tolist() == expected.tolist()
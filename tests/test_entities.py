@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from graph.constants import NAMESPACE_ENTITY
+from graph.entities import EntityTable
+from graph.ids import IdAllocator, parse_id, render_id
+from graph.structure import create_activity
+import numpy as np
+
+
+def test_entity_table():
+    table = EntityTable(IdAllocator())
+    first = table.add(1, "a", 0)
+    assert table.get(1, "a", 0) == first
+    assert table.get(1.0, "a", 0) is None  # values of different types
+    assert (True, "a", 0) not in table
+    assert table.get_or_add(1, "a", 0) == first
+
+    second = table.get_or_add(np.nan, "a", 1)
+    assert table.get(float("nan"), "a", 1) == second
+    assert len(table) == 2
+    assert table.row(1)["id"] == second
+    assert table[0] == {
+        "id": first,
+        "value": 1,
+        "type": "int",
+        "feature_name": "a",
+        "index": 0,
+        "name": [],
+    }
+
+
+def test_entity_table_new_version_of_a_cell():
+    table = EntityTable(IdAllocator())
+    first = table.add("x", "a", 0)
+    second = table.add("x", "a", 0)
+    assert first != second
+    assert table.get("x", "a", 0) == second
+
+
+def test_ids_are_deterministic():
+    first, second = IdAllocator(), IdAllocator()
+    ids = [first(NAMESPACE_ENTITY, "a", i, "v") for i in range(100)]
+    assert ids == [second(NAMESPACE_ENTITY, "a", i, "v") for i in range(100)]
+    assert len(set(ids)) == len(ids)
+    assert all(0 <= i < 2**63 for i in ids)
+
+
+def test_ids_of_the_same_content():
+    ids = IdAllocator()
+    same = [ids(NAMESPACE_ENTITY, "a", 0, "v") for _ in range(3)]
+    assert len(set(same)) == 3
+
+    ids.reset()
+    assert ids(NAMESPACE_ENTITY, "a", 0, "v") == same[0]
+    assert ids(NAMESPACE_ENTITY, "a", 0, "v") == same[1]
+
+
+def test_only_duplicates_are_counted():
+    ids = IdAllocator()
+    for i in range(10_000):
+        ids(NAMESPACE_ENTITY, "a", i % 9_000)
+
+    assert len(ids._issued) == 9_000
+    assert len(ids._duplicates) == 1_000
+    assert ids._issued.nbytes() <= 4 * 8 * len(ids._issued)
+
+
+def test_activity_ids_ignore_the_context():
+    first, second = (
+        create_activity(
+            function_name="f",
+            context=context,
+            code="df = df.dropna()",
+            code_line="3",
+            exception_text=" ",
+            ids=IdAllocator(),
+        )
+        for context in ("Drop the missing values", "Remove the NaNs")
+    )
+    assert first["id"] == second["id"]
+
+
+def test_render_id():
+    assert parse_id(render_id(NAMESPACE_ENTITY, 255)) == 255
+    assert parse_id(42) == 42
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from tracking.fingerprint import Fingerprints
+import pandas as pd
+
+
+def test_renamed_columns_share_their_fingerprint():
+    df = pd.DataFrame({"a": [1, 2, 3], "b": [1.0, 2.0, 3.0]})
+    fingerprints = Fingerprints(df)
+    assert (
+        Fingerprints(df.rename(columns={"a": "c"}))["c"] == fingerprints["a"]
+    )
+    assert fingerprints["a"] != fingerprints["b"]  # different dtype kinds
+    assert fingerprints["a"] != Fingerprints(df.set_index("b"))["a"]
+
+
+def test_rebind_keeps_the_fingerprints_of_the_same_values():
+    df1 = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]})
+    fingerprints = Fingerprints(df1)
+    fingerprints["a"], fingerprints["b"]
+
+    # same index, columns and dtypes, but changed values
+    df2 = df1.assign(b=["x", "y", "w"])
+    rebound = fingerprints.rebind(df2)
+    assert rebound.df is df2
+    assert rebound["a"] == fingerprints["a"]
+    assert rebound["b"] == Fingerprints(df2)["b"] != fingerprints["b"]
+
+    rebound = fingerprints.rebind(df1.copy())
+    assert rebound._columns == fingerprints._columns
+    assert fingerprints.rebind(df1.iloc[::-1])._columns == dict()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from graph.async_neo4j import AsyncNeo4jWriter
+from graph.neo4j import (
+    forget_edges,
+    Neo4jQueries,
+    Neo4jQueryExecutor,
+    Neo4jWriterPool,
+    new_edges,
+)
+import asyncio
+import pytest
+import threading
+
+
+class FakeSession:
+    def __init__(self, failing=(), failures=None):
+        self.failing = failing
+        self.failures = failures  # how many runs fail, if not None
+        self.queries = list()
+
+    def run(self, query, parameters):
+        if query in self.failing or self.failures:
+            if self.failures:
+                self.failures -= 1
+            raise RuntimeError(query)
+        self.queries.append((query, parameters))
+        return self
+
+    def consume(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeConnector:
+    def __init__(self, session=None):
+        self.session = session
+
+    def create_session(self, db=None):
+        if self.session is None:
+            raise ConnectionError("unreachable")
+        return self.session
+
+
+def test_failed_queries_are_raised():
+    session = FakeSession(failing=("bad",))
+    executor = Neo4jQueryExecutor(FakeConnector(session), workers=2)
+    executor.batch_size = 2
+    try:
+        executor.insert_data_multiprocess("good", list(range(5)))
+        assert len(session.queries) == 3
+        with pytest.raises(RuntimeError):
+            executor.insert_data_multiprocess("bad", list(range(5)))
+    finally:
+        executor.close()
+
+
+def test_failed_sessions_do_not_hang():
+    pool = Neo4jWriterPool(FakeConnector(), workers=2, queue_size=1)
+    # more batches than the queue holds, which would block if unserved
+    futures = [pool.submit("query", dict()) for _ in range(8)]
+    for future in futures:
+        with pytest.raises(ConnectionError):
+            future.result(timeout=5)
+    pool.close()
+
+    executor = Neo4jQueryExecutor(FakeConnector(), workers=2)
+    try:
+        with pytest.raises(ConnectionError):
+            executor.insert_data_multiprocess("query", list(range(10)))
+    finally:
+        executor.close()
+
+
+class Rows:
+    """Rows counting the batches sliced out of them"""
+
+    def __init__(self, n):
+        self.n, self.sliced = n, 0
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, item):
+        self.sliced += 1
+        return list(range(self.n))[item]
+
+
+def test_batches_are_submitted_lazily():
+    rows = Rows(20)
+    session = FakeSession(failures=1)
+    run, sliced = session.run, list()
+
+    def counting_run(query, parameters):
+        sliced.append(rows.sliced)
+        return run(query, parameters)
+
+    session.run = counting_run
+    executor = Neo4jQueryExecutor(FakeConnector(session), workers=1)
+    executor.batch_size, failed = 2, list()
+    try:
+        with pytest.raises(RuntimeError):
+            executor.insert_data_multiprocess("query", rows, failed.append)
+    finally:
+        executor.close()
+    # the running, the two queued and the blocked batch at most
+    assert sliced[0] <= 4
+    assert failed == [[0, 1]]
+    assert len(session.queries) == 9
+
+
+def edges(*pairs):
+    return [{"start": start, "end": end} for start, end in pairs]
+
+
+def test_new_edges():
+    written = set()
+    rows = edges((1, 2), (2, 1), (1, 2))
+    assert new_edges(written, rows) == edges((1, 2), (2, 1))
+    assert new_edges(written, edges((1, 2), (1, 3))) == edges((1, 3))
+    forget_edges(written, edges((2, 1)))
+    assert new_edges(written, rows) == edges((2, 1))
+
+
+def test_failed_edges_are_written_again():
+    session = FakeSession(failures=1)
+    queries = Neo4jQueries(Neo4jQueryExecutor(FakeConnector(session)))
+    derivations = [{"gen": 1, "used": 2}, {"gen": 3, "used": 4}]
+    try:
+        with pytest.raises(RuntimeError):
+            queries.add_derivations(derivations)
+        queries.add_derivations(derivations)
+        queries.add_derivations(derivations)
+    finally:
+        queries.close()
+    ((_, parameters),) = session.queries
+    assert parameters["rows"] == edges((1, 2), (3, 4))
+
+
+def test_failed_async_edges_are_written_again():
+    writer = AsyncNeo4jWriter("bolt://localhost", "user", "pwd", batch_size=1)
+    written, failures = list(), [1]
+
+    async def transaction(query, rows):
+        if failures and rows == edges((3, 4)):
+            raise RuntimeError(failures.pop())
+        written.extend(rows)
+
+    writer._transaction = transaction
+    derivations = [{"gen": 1, "used": 2}, {"gen": 3, "used": 4}]
+    try:
+        writer.write({"derivation": derivations})
+        with pytest.raises(RuntimeError):
+            writer.wait()
+        writer.write({"derivation": derivations})
+        writer.wait()
+    finally:
+        writer.close()
+    assert written == edges((1, 2), (3, 4))
+
+
+def test_pending_async_edges_are_not_skipped():
+    writer = AsyncNeo4jWriter("bolt://localhost", "user", "pwd")
+    written, failures, release = list(), [1], threading.Event()
+
+    async def transaction(query, rows):
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        if failures:
+            raise RuntimeError(failures.pop())
+        written.extend(rows)
+
+    writer._transaction = transaction
+    derivations = [{"gen": 1, "used": 2}]
+    try:
+        # the second write is enqueued before the first one fails
+        writer.write({"derivation": derivations})
+        writer.write({"derivation": derivations})
+        release.set()
+        with pytest.raises(RuntimeError):
+            writer.wait()
+    finally:
+        writer.close()
+    assert written == edges((1, 2))
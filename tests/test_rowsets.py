@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from graph.rowsets import encode_labels, RowSet
+import pandas as pd
+
+
+def test_from_positions():
+    rows = RowSet.from_positions([7, 3, 4, 5, 9, 4, 10])
+    assert rows.to_list() == [3, 3, 7, 1, 9, 2]
+    assert len(rows) == 6
+    assert rows.to_positions().tolist() == [3, 4, 5, 7, 9, 10]
+
+
+def test_empty():
+    rows = RowSet.from_positions([])
+    assert rows.to_list() == []
+    assert len(rows) == 0
+    assert 0 not in rows
+    assert rows.to_positions().tolist() == []
+
+
+def test_round_trip():
+    rows = RowSet.from_positions(range(0, 1000, 3))
+    assert RowSet.from_list(rows.to_list()) == rows
+
+
+def test_contains():
+    rows = RowSet.from_list([10, 5, 20, 1])
+    assert [i for i in range(25) if i in rows] == [10, 11, 12, 13, 14, 20]
+
+
+def test_union():
+    rows = RowSet.from_list([0, 2]).union(RowSet.from_list([2, 2, 8, 1]))
+    assert rows.to_list() == [0, 4, 8, 1]
+
+
+def test_encode_labels():
+    assert encode_labels("rows", "labels", pd.Index([1, 2, 3, 7])) == {
+        "rows": [1, 3, 7, 1]
+    }
+    assert encode_labels("rows", "labels", pd.Index(["a", "b", "a"])) == {
+        "labels": ["a", "b"]
+    }
+    # a list property holds values of a single type
+    assert encode_labels("rows", "labels", pd.Index([1, "b", 2.5, 1])) == {
+        "labels": ["1", "b", "2.5"]
+    }
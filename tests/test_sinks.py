@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from glob import glob
+from graph.records import (
+    ActivityRecord,
+    ColumnRecord,
+    DerivationRecord,
+    EntityRecord,
+    KeepRecord,
+    MembershipRecord,
+    RelationRecord,
+)
+from graph.sinks import ARRAY_DELIMITER, CsvSink, Sink
+from os.path import basename
+import csv
+import gzip
+import pytest
+import re
+
+#: A header field of the neo4j-admin database import CSV files
+HEADER_FIELD = re.compile(
+    r"(\w+)?:(ID|START_ID|END_ID)\(\w+\)"
+    r"|\w+:(int|long|float|double|boolean|byte|short|char|string"
+    r"|point|date|localtime|time|localdatetime|datetime|duration)(\[\])?"
+)
+
+ACTIVITIES = [
+    {"id": 1, "function_name": "f", "deleted_rows": [0, 2], "context": None},
+    {"id": 2, "function_name": "g", "deleted_rows": [], "context": "c"},
+]
+
+
+def records():
+    entity = {"id": 10, "value": 1.5, "feature_name": "a", "index": 0}
+    yield ActivityRecord(ACTIVITIES[0])
+    yield ColumnRecord({"id": 20, "value": "[1.5]", "instance": "a"})
+    yield EntityRecord(entity)
+    yield EntityRecord(dict(entity, id=11, value="x"))
+    yield DerivationRecord({"gen": 11, "used": 10}, False)
+    yield DerivationRecord(
+        {
+            "gen": 20,
+            "used": 20,
+            "rule": {"id": 30, "transformation": "cast", "rows": [0, 1]},
+        },
+        True,
+    )
+    yield RelationRecord(([11], [10], [10], False, 1), False)
+    yield RelationRecord(([11], [10], [10], False, 1), False)  # duplicated
+    yield MembershipRecord(20, [10, 11])
+    yield KeepRecord(11)
+
+
+def read(path: str):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="") as f:
+        return list(csv.reader(f))
+
+
+def written(path: str) -> dict:
+    return {
+        basename(filename): read(filename)
+        for filename in glob(f"{path}/*.csv*")
+    }
+
+
+def relationships(files: dict, relation: str, start: str, end: str):
+    """Return the rows of the relationships file with the given labels"""
+    header = [f":START_ID({start})", f":END_ID({end})"]
+    (rows,) = [
+        rows
+        for filename, (first, *rows) in files.items()
+        if filename.startswith(f"{relation}.") and first == header
+    ]
+    return rows
+
+
+def test_headers(tmp_path):
+    with CsvSink(str(tmp_path)) as sink:
+        sink.write(records())
+    files = written(tmp_path)
+
+    assert files
+    for filename, (header, *rows) in files.items():
+        for field in header:
+            assert HEADER_FIELD.fullmatch(field), (filename, field)
+        assert all(len(row) == len(header) for row in rows)
+
+
+def test_nodes_and_relationships(tmp_path):
+    sink = CsvSink(str(tmp_path))
+    sink.write(records())
+    sink.close(ACTIVITIES)
+    files = written(tmp_path)
+
+    header, row = files["Activity.nodes.0.csv"]
+    assert header == [
+        "id:ID(Activity)",
+        "function_name:string",
+        "deleted_rows:long[]",
+    ]
+    assert row == ["1", "f", ARRAY_DELIMITER.join(("0", "2"))]
+    header, row = files["Activity.nodes.1.csv"]  # other properties
+    assert header[0] == "id:ID(Activity)" and row[0] == "2"
+
+    assert files["Entity.nodes.0.csv"][0] == [
+        "id:ID(Entity)",
+        "value:double",
+        "feature_name:string",
+        "index:long",
+    ]
+    assert files["Entity.nodes.1.csv"][0][1] == "value:string"
+    assert files["Rule.nodes.0.csv"][1] == ["30", "cast", "0\x1f1"]
+
+    assert relationships(files, "USED", "Activity", "Entity") == [["1", "10"]]
+    assert relationships(files, "USED", "Rule", "Column") == [["30", "20"]]
+    assert relationships(files, "WAS_DERIVED_FROM", "Entity", "Entity") == [
+        ["11", "10"]
+    ]
+    assert relationships(files, "BELONGS_TO", "Entity", "Column") == [
+        ["10", "20"],
+        ["11", "20"],
+    ]
+    assert relationships(files, "NEXT", "Activity", "Activity") == [["1", "2"]]
+
+
+def test_keep_only(tmp_path):
+    with CsvSink(str(tmp_path), compress=True, keep_only=True) as sink:
+        sink.write(records())
+    files = written(tmp_path)
+
+    entities = [
+        row
+        for filename, (_, *rows) in files.items()
+        if filename.startswith("Entity.nodes.")
+        for row in rows
+    ]
+    assert [row[0] for row in entities] == ["11"]
+    assert all(filename.endswith(".csv.gz") for filename in files)
+
+
+def test_sinks_implement_the_writes():
+    class PartialSink(Sink):
+        def _write(self, record):
+            pass
+
+    with pytest.raises(TypeError):
+        PartialSink()
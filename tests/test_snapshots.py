@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from os import listdir
+from shutil import rmtree
+from tracking.archive import load_archive, save_archive
+from tracking.diff import match_rows
+from tracking.snapshots import SnapshotStore
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def frame(n=8):
+    return pd.DataFrame(
+        {
+            "a": np.arange(n, dtype=np.int64),
+            "b": np.linspace(0, 1, n),
+            "s": [f"v{i}" for i in range(n)],
+        }
+    )
+
+
+@pytest.fixture
+def pandas_options():
+    """Restore the pandas options (e.g. Copy-on-Write) after the test"""
+    if int(pd.__version__.split(".")[0]) >= 3:
+        yield  # Copy-on-Write is always enabled
+    else:
+        copy_on_write = pd.get_option("mode.copy_on_write")
+        with pd.option_context("mode.copy_on_write", copy_on_write):
+            yield
+
+
+def store_steps(store, *frames):
+    store.subscribe(frames[0])
+    for df in frames[1:]:
+        store.append(df)
+    return store
+
+
+def test_delta_round_trip():
+    df0 = frame()
+    df1 = df0.assign(b=df0["b"] * 2)
+    df2 = df1.drop(index=[1, 5])
+    store = store_steps(SnapshotStore(), df0, df1, df2)
+
+    assert len(store) == 2
+    pd.testing.assert_frame_equal(store[0]["before"], df0)
+    pd.testing.assert_frame_equal(store[0]["after"], df1)
+    pd.testing.assert_frame_equal(store[1]["after"], df2)
+
+    # the unchanged columns are shared, the changed one is stored again
+    first, second, third = store._snapshots
+    assert first.versions[0] == second.versions[0]
+    assert first.versions[1] != second.versions[1]
+    # the rows only dropped are stored as positions of the previous ones
+    assert all(
+        store._versions[version].positions is not None
+        for version in third.versions
+    )
+
+
+def test_row_ids_follow_the_rows():
+    df0 = frame()
+    df1 = df0.drop(index=[0]).reset_index(drop=True)
+    store = store_steps(SnapshotStore(), df0, df1)
+
+    before, after = store[0]["row_ids"]
+    assert before.tolist() == list(range(8))
+    assert after.tolist() == list(range(1, 8))
+
+
+def test_row_ids_follow_sorted_rows():
+    df0 = frame()
+    df1 = df0.sort_values("b", ascending=False).reset_index(drop=True)
+    df2 = df1.assign(b=df1["b"] * 2)
+    store = store_steps(SnapshotStore(), df0, df1, df2)
+
+    # same labels, but the rows were reordered
+    assert store[0]["row_ids"][1].tolist() == list(range(7, -1, -1))
+    pd.testing.assert_frame_equal(store[0]["after"], df1)
+    # same labels and rows, but a changed column
+    before, after = store[1]["row_ids"]
+    assert after.tolist() == before.tolist()
+    assert store._snapshots[2].versions[0] == store._snapshots[1].versions[0]
+
+
+def test_spill_round_trip(tmp_path):
+    df0 = frame(100)
+    df1 = df0.assign(a=df0["a"] + 1, s=df0["s"].str.upper())
+    df2 = df1.assign(b=0.0)
+    store = store_steps(
+        SnapshotStore(memory_budget=0, spill_dir=str(tmp_path)),
+        df0,
+        df1,
+        df2,
+    )
+
+    # the columns of the last snapshot are kept to diff the next one
+    last = store._snapshots[-1]
+    assert store.nbytes() == sum(
+        store._versions[version].nbytes() for version in last.versions
+    )
+    spilled = ["0.npy", "1.npy"]
+    if isinstance(df0["s"].array, pd.arrays.ArrowExtensionArray):
+        spilled.append("2.arrow")  # Python strings are kept in memory
+    assert sorted(listdir(tmp_path)) == spilled
+    pd.testing.assert_frame_equal(store[0]["before"], df0)
+    pd.testing.assert_frame_equal(store[0]["after"], df1)
+    pd.testing.assert_frame_equal(store[1]["after"], df2)
+
+    store.forget(1)
+    pd.testing.assert_frame_equal(store.materialize(2), df2)
+
+
+def test_objects_are_not_spilled(tmp_path):
+    df0 = pd.DataFrame({"o": pd.array([1, "x"] * 50, dtype=object)})
+    df1 = df0.assign(o=df0["o"].astype(str).astype(object))
+    store = store_steps(
+        SnapshotStore(memory_budget=0, spill_dir=str(tmp_path)), df0, df1
+    )
+
+    assert listdir(tmp_path) == []
+    assert store.nbytes() > 0
+    pd.testing.assert_frame_equal(store[0]["before"], df0)
+
+
+def test_taken_rows_are_accounted():
+    df0 = frame(100)
+    df1 = df0.iloc[::2]
+    store = store_steps(SnapshotStore(), df0, df1)
+
+    resident = sum(version.nbytes() for version in store._versions.values())
+    taken = sum(store._last_values[v].nbytes for v in store._last.versions)
+    assert store.nbytes() == resident + taken
+
+
+def test_match_rows_by_label():
+    index1, index2 = pd.Index([10, 11, 12]), pd.Index([12, 10, 13])
+    assert match_rows(index1, index2).tolist() == [2, 0, -1]
+
+
+def test_match_rows_by_values():
+    df1 = frame()
+    df2 = df1.sort_values("b", ascending=False).reset_index(drop=True)
+    hashes1 = pd.util.hash_pandas_object(df1, index=False).to_numpy()
+    hashes2 = pd.util.hash_pandas_object(df2, index=False).to_numpy()
+
+    matched = match_rows(df1.index, df2.index, hashes1, hashes2)
+    assert matched.tolist() == list(range(7, -1, -1))
+
+
+def test_match_rows_changed_values_by_label():
+    df1 = frame()
+    df2 = df1.assign(b=0.5)
+    hashes1 = pd.util.hash_pandas_object(df1, index=False).to_numpy()
+    hashes2 = pd.util.hash_pandas_object(df2, index=False).to_numpy()
+
+    matched = match_rows(df1.index, df2.index, hashes1, hashes2)
+    assert matched.tolist() == list(range(8))
+
+
+@pytest.mark.parametrize("copy_on_write", (False, True))
+def test_in_place_changes_keep_the_snapshots(pandas_options, copy_on_write):
+    df = frame()
+    store = SnapshotStore(copy_on_write=copy_on_write)
+    store.subscribe(df)
+    expected = [df.copy()]
+    df.loc[0, "a"] = 99
+    df["b"] *= 2
+    store.append(df)
+    expected.append(df.copy())
+    df.drop(columns=["s"], inplace=True)
+    df.loc[:, "a"] = 0
+    df.sort_values("b", ascending=False, inplace=True)
+    store.append(df)
+    expected.append(df.copy())
+    df.loc[3, "b"] = -1.0
+
+    for snapshot_id, df in enumerate(expected):
+        pd.testing.assert_frame_equal(store.materialize(snapshot_id), df)
+
+
+@pytest.mark.parametrize(
+    "kwargs", (dict(), dict(copy_on_write=True), dict(memory_budget=0))
+)
+def test_archive_round_trip(tmp_path, pandas_options, kwargs):
+    df0 = frame(100)
+    df1 = df0.assign(a=df0["a"] + 1, s=df0["s"].str.upper())
+    df2 = df1.drop(index=[3, 7]).sort_values("b", ascending=False)
+    spill_dir = tmp_path / "spill"
+    store = store_steps(
+        SnapshotStore(spill_dir=str(spill_dir), **kwargs), df0, df1, df2
+    )
+    row_ids = [store.row_ids(snapshot_id) for snapshot_id in range(3)]
+    path = str(tmp_path / "archive.pkl.gz")
+    save_archive(path, store, [{"function_name": "f"}], "", {1: "[]"})
+    if "memory_budget" in kwargs:
+        # the spilled columns were saved in the archive
+        assert listdir(spill_dir)
+        rmtree(spill_dir)
+
+    archive = load_archive(path)
+    assert archive["activities"] == [{"function_name": "f"}]
+    assert archive["used_columns_answers"] == {1: "[]"}
+    changes = archive["changes"]
+    assert len(changes) == 2
+    for snapshot_id, df in enumerate((df0, df1, df2)):
+        pd.testing.assert_frame_equal(changes.materialize(snapshot_id), df)
+        np.testing.assert_array_equal(
+            changes.row_ids(snapshot_id), row_ids[snapshot_id]
+        )
+
+    # the loaded store goes on diffing the next snapshots
+    changes.append(df2.assign(b=1.0))
+    pd.testing.assert_frame_equal(changes[2]["after"], df2.assign(b=1.0))
+    np.testing.assert_array_equal(changes.row_ids(3), row_ids[2])
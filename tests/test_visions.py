@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from argparse import Namespace
+from ast import literal_eval
+from graph.structure import create_activity
+from tracking import column_approach, column_entity_approach
+from tracking.diff import FrameDiff, TRANSFORMATIONS
+from tracking.tracking import ProvenanceTracker
+from tracking.variants import MultiVision, variant_args, VARIANTS
+import numpy as np
+import pandas as pd
+import pytest
+import random
+
+EVAL = "i_do_completely_trust_llms_thus_i_will_evaluate_their_code_on_my_machine"  # noqa
+
+
+@pytest.fixture(autouse=True)
+def no_llm_code(monkeypatch):
+    for module in (column_approach, column_entity_approach):
+        monkeypatch.setattr(module, EVAL, literal_eval)
+
+
+def vision(cls, acts, **kwargs):
+    args = Namespace(
+        budget=None,
+        compact=None,
+        diff_workers=1,
+        granularity_level=3,
+        prov_column_level=cls is column_approach.ColumnVision,
+        prov_entity_level=cls is column_entity_approach.ColumnEntityVision,
+        row_sets=False,
+    )
+    vars(args).update(kwargs)
+    activities = [
+        create_activity(
+            function_name=f"f{i}", context="", code="", exception_text=""
+        )
+        for i in range(acts)
+    ]
+    return cls(activities, args, {i + 1: "[]" for i in range(acts)})
+
+
+@pytest.mark.parametrize(
+    "cls",
+    (column_approach.ColumnVision, column_entity_approach.ColumnEntityVision),
+)
+def test_drained_columns_keep_their_deleted_rows(cls):
+    v = vision(cls, 3)
+    after = pd.DataFrame({"a": [1, 2]})
+    v.step(1, pd.DataFrame({"a": [1, 2, 3]}), after)
+    list(v.drain())
+    column = next(
+        c for c in v.current_columns.values() if c["index"] == "[0, 1]"
+    )
+    assert column["deleted_rows"] == [2, 1]
+
+    # the same column is generated again, dropping another row
+    v.step(3, pd.DataFrame({"a": [1, 2, 9]}, index=[0, 1, 5]), after)
+    assert column["deleted_rows"] == [2, 1]
+    assert v.current_activities[2]["deleted_rows"] == [5, 1]
+
+
+def derivations(df1, df2, rows, level=3):
+    """The (col, index, value) of the generated and used cells"""
+    v = vision(
+        column_entity_approach.ColumnEntityVision, 1, granularity_level=level
+    )
+    row_ids = (np.arange(len(df1.index)), np.asarray(rows))
+    v.step(1, df1, df2, row_ids)
+    cells = {
+        e["id"]: (e["feature_name"], e["index"], e["value"])
+        for e in v.current_entities.values()
+    }
+    return sorted((cells[d["gen"]], cells[d["used"]]) for d in v.derivations)
+
+
+@pytest.mark.parametrize("level", (1, 3))
+def test_dropped_and_relabeled_rows(level):
+    df1 = pd.DataFrame({"a": [10, 21], "b": [0, 1]})
+    df2 = df1.drop(index=[0]).reset_index(drop=True)
+    df2["a"] *= 2
+    # the derivation uses the existing cell, under its old label
+    assert derivations(df1, df2, [1], level) == [(("a", 0, 42), ("a", 1, 21))]
+
+
+def test_sorted_and_relabeled_rows():
+    df1 = pd.DataFrame({"a": [3, 1, 2]})
+    df2 = df1.sort_values("a").reset_index(drop=True) * 10
+    assert derivations(df1, df2, [1, 2, 0]) == [
+        (("a", 0, 10), ("a", 1, 1)),
+        (("a", 1, 20), ("a", 2, 2)),
+        (("a", 2, 30), ("a", 0, 3)),
+    ]
+
+
+def pipeline_changes():
+    df0 = pd.DataFrame({"a": [1, 2, 3, 4], "b": ["x", "y", "z", "w"]})
+    df1 = df0.assign(a=df0["a"] * 10)
+    df2 = df1.drop(columns=["b"]).assign(c=[0.5, 1.5, 2.5, 3.5])
+    df3 = df2.drop(index=[1])
+    return {
+        1: {"before": df0, "after": df1},
+        2: {"before": df1, "after": df2},
+        3: {"before": df2, "after": df3},
+    }
+
+
+def collected(records):
+    """The records by kind, with the members of each column merged"""
+    ret = dict()
+    for record in records:
+        if record.kind == "membership":
+            members = ret.setdefault(("membership", None), dict())
+            members.setdefault(record.column, list()).extend(record.entities)
+        elif record.kind != "activity":
+            key = record.kind, getattr(record, "columns", None)
+            ret.setdefault(key, list()).append(record[0])
+    return ret
+
+
+def extracted(result):
+    """The collections returned by Vision.extract() like collected()"""
+    (
+        entities,
+        columns,
+        relations,
+        relations_column,
+        derivations,
+        derivations_column,
+        columns_to_entities,
+        entities_to_keep,
+    ) = result
+    ret = {
+        ("entity", None): list(entities.values()),
+        ("column", None): list(columns.values()),
+        ("relation", False): relations,
+        ("relation", True): relations_column,
+        ("derivation", False): derivations,
+        ("derivation", True): derivations_column,
+        ("membership", None): {
+            column: members
+            for column, members in columns_to_entities.items()
+            if members
+        },
+        ("keep", None): entities_to_keep,
+    }
+    return {key: value for key, value in ret.items() if value}
+
+
+@pytest.mark.parametrize(
+    "cls",
+    (column_approach.ColumnVision, column_entity_approach.ColumnEntityVision),
+)
+def test_drain_matches_extract(cls):
+    changes = pipeline_changes()
+    v = vision(cls, 3)
+    v.used_columns_answers[1] = "['a']"
+    result = cls.extract(
+        changes, v.current_activities, v.args, dict(v.used_columns_answers)
+    )
+
+    records = list()
+    for act, step in changes.items():
+        v.step(act, step["before"], step["after"])
+        records.extend(v.drain())
+    v.close()
+    assert [r.kind for r in records].count("activity") == 3
+    assert collected(records) == extracted(result)
+
+
+def run_pipeline(tracker):
+    df = tracker.subscribe(
+        pd.DataFrame({"a": [1, 2, 3, 4], "b": ["x", "y", "z", "w"]})
+    )
+    tracker.analyze_changes(df)  # the operation 0 is never diffed
+    df["a"] = df["a"] * 10
+    tracker.analyze_changes(df)
+    df = df.drop(columns=["b"])
+    df["c"] = [0.5, 1.5, 2.5, 3.5]
+    tracker.analyze_changes(df)
+    df = df.drop(index=[1]).sort_values("c", ascending=False)
+    tracker.analyze_changes(df)
+
+
+@pytest.mark.parametrize(
+    "cls",
+    (column_approach.ColumnVision, column_entity_approach.ColumnEntityVision),
+)
+def test_streaming_matches_batch(cls):
+    v = vision(cls, 3)
+    records = list()
+
+    def on_change(act, df_before, df_after, row_ids):
+        v.step(act, df_before, df_after, row_ids)
+        records.extend(v.drain())
+
+    run_pipeline(ProvenanceTracker(on_change=on_change))
+    v.close()
+
+    tracker = ProvenanceTracker()
+    run_pipeline(tracker)
+    assert list(tracker.changes.keys()) == [0, 1, 2, 3]
+    result = cls.extract(
+        tracker.changes, v.current_activities, v.args, v.used_columns_answers
+    )
+    assert collected(records) == extracted(result)
+
+
+def test_multi_vision_matches_each_vision(monkeypatch):
+    # the variants sample their cells from the same random generator
+    monkeypatch.setattr(random, "choice", lambda cells: cells[len(cells) // 2])
+    monkeypatch.setattr(random, "randrange", lambda n: n // 2)
+    changes = pipeline_changes()
+    df3 = changes[3]["after"]
+    changes[4] = {"before": df3, "after": df3.rename(columns={"a": "A"})}
+    args = vision(column_approach.ColumnVision, 4).args
+    activities = vision(column_approach.ColumnVision, 4).current_activities
+    answers = {1: "['a']", 2: "[]", 3: "[]", 4: "['a']"}
+
+    multi = MultiVision(activities, args, VARIANTS, dict(answers))
+    records = {variant: list() for variant in VARIANTS}
+    for act, step in changes.items():
+        multi.step(act, step["before"], step["after"])
+        for variant in VARIANTS:
+            records[variant].extend(multi.drain(variant))
+    multi.close()
+
+    for variant in VARIANTS:
+        vision_args = variant_args(args, variant)
+        v = (
+            column_entity_approach.ColumnEntityVision
+            if vision_args.prov_entity_level
+            else column_approach.ColumnVision
+        )([dict(a) for a in activities], vision_args, dict(answers))
+        expected = list()
+        for act, step in changes.items():
+            v.step(act, step["before"], step["after"])
+            expected.extend(v.drain())
+        v.close()
+        assert collected(records[variant]) == collected(expected), variant
+        assert multi.activities(variant) == v.current_activities
+
+
+@pytest.mark.parametrize(
+    "cast, budget, level, compact",
+    (
+        (True, 40, 3, None),  # 20 changed cells and their old values
+        (True, 39, 3, TRANSFORMATIONS),  # the cast is a single rule
+        (False, 39, 1, TRANSFORMATIONS),  # no rule, hence sampled
+    ),
+)
+def test_budget_granularity(cast, budget, level, compact):
+    df1 = pd.DataFrame({"a": np.arange(20), "b": 0})
+    df2 = df1.assign(a=df1["a"].astype(str) if cast else df1["a"] + 1)
+    v = vision(column_entity_approach.ColumnEntityVision, 1, budget=budget)
+    diff = FrameDiff(df1, df2)
+    assert v._cost(diff, None, False) == 40
+    assert v._granularity(1, diff) == (level, compact, compact is not None)
+
+    v.step(1, df1, df2)
+    assert v.current_activities[0]["granularity_level"] == level
+    if level > 1:
+        assert len(v.current_entities) <= budget
+    else:
+        # a generated cell, its old value and a used cell at most
+        assert len(v.current_entities) <= 3
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sampled_cells_are_level_3_cells(seed):
+    df1 = pd.DataFrame({"a": [1, 2, 3, 4], "b": list("wxyz"), "c": 0.5})
+    df2 = df1.drop(columns=["b"]).drop(index=[2])
+    df2["a"] *= 10
+    df2["d"] = df2["a"] + 1
+
+    def cells(level):
+        v = vision(
+            column_entity_approach.ColumnEntityVision,
+            1,
+            granularity_level=level,
+        )
+        v.step(1, df1, df2)
+        return v, {
+            (e["feature_name"], e["index"], e["value"])
+            for e in v.current_entities.values()
+        }
+
+    _, all_cells = cells(3)
+    random.seed(seed)
+    v, sampled = cells(1)
+    assert sampled and sampled <= all_cells
+    # a generated cell (and the cell it is derived from) and a used one
+    assert len(v.entities_to_keep) == 2
+    assert len(sampled) <= 3
+    (generated,), (used,), _, _, _ = v.current_relations[0]
+    assert v.entities_to_keep == [generated, used]
+    # the sample depends just on the seed
+    random.seed(seed)
+    assert cells(1)[1] == sampled
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+from logging import debug
+from tracking.snapshots import SnapshotStore
+from typing import Dict, List
+import gzip
+import pickle
+
+#: Bumped whenever the content of the archives changes
+ARCHIVE_VERSION = 1
+
+
+def save_archive(
+    path: str,
+    changes: SnapshotStore,
+    activities: List[Dict[str, any]],
+    exception_text: str,
+    used_columns_answers: Dict[int, str],
+) -> None:
+    """
+    Save to a gzip-compressed pickle everything needed to recompute
+    the provenance of a pipeline run without running the pipeline or
+    asking the LLMs again (see main.py --replay).
+
+    :param path: The file to write.
+    :param changes: The snapshots of the ProvenanceTracker.
+    :param activities: The descriptions of the activities, i.e. the
+                       dictionaries given to create_activity().
+    :param exception_text: The exception raised by the pipeline, if any.
+    :param used_columns_answers: The used columns answered by the LLM
+                                 for each activity number, see
+                                 ColumnEntityVision.used_columns_answers.
+    """
+
+    with gzip.open(path, "wb", compresslevel=1) as f:
+        pickle.dump(
+            {
+                "version": ARCHIVE_VERSION,
+                "changes": changes,
+                "activities": activities,
+                "exception_text": exception_text,
+                "used_columns_answers": used_columns_answers,
+            },
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    debug(f"snapshot archive saved to {path}")
+
+
+def load_archive(path: str) -> Dict[str, any]:
+    """Load an archive written by save_archive() as a dictionary"""
+    with gzip.open(path, "rb") as f:
+        archive = pickle.load(f)
+    if archive.get("version", None) != ARCHIVE_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot archive version {archive.get('version')}"
+        )
+    return archive
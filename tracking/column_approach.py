@@ -24,222 +24,149 @@
 # You should have received a copy of the GNU General Public License
 # along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
 
-from LLM.LLM_activities_used_columns import LLM_activities_used_columns
 from logging import debug, info, warning
-from graph.structure import create_column, create_relation_column
+from graph.entities import EntityTable
+from graph.records import DerivationRecord, Record, RelationRecord
+from graph.rowsets import encode_labels
+from graph.structure import create_relation_column
+from tracking.diff import FrameDiff
+from tracking.vision import Vision
+from typing import Iterator
 from utils import (
     i_do_completely_trust_llms_thus_i_will_evaluate_their_code_on_my_machine,
 )
-import math
 
 
-def is_number(value):
-    try:
-        float(value)
-        return True
-    except ValueError:
-        return False
+class ColumnVision(Vision):
+    """
+    Column-level provenance extractor
 
+    Same interface of column_entity_approach.ColumnEntityVision, each
+    call to step() diffs the dataframes before/after an activity and
+    accumulates the columns, derivations and relations found.
+    """
 
-def column_vision(changes, current_activities, args):
-    assert args.prov_column_level
+    def __init__(self, current_activities, args, used_columns_answers=None):
+        assert args.prov_column_level
+        super().__init__(current_activities, args, used_columns_answers)
+        self.derivations_column = list()
+        self.current_relations_column = list()
 
-    derivations_column = list()
-    current_relations_column = list()
-    current_columns = dict()
-
-    used_columns_giver = LLM_activities_used_columns()
+    def step(self, act, df1, df2, row_ids=None, diff=None, fingerprints=None):
+        """
+        Find the differences between df1 and df2, i.e. the dataframes
+        before and after the act-th activity, whose rows are matched
+        by their row_ids when given (see SnapshotStore.row_ids());
+        their FrameDiff and Fingerprints (see fingerprints()) can be
+        given as well, e.g. when shared by several visions
+        """
+        if act == 0:
+            return  # subscribe() is followed by an analyze_changes()
+        current_relations_column = self.current_relations_column
+        derivations_column = self.derivations_column
 
-    for act in changes.keys():
         generated_columns = list()
         used_columns = list()
         invalidated_columns = list()
-        if act == 0:
-            continue
-        activity = current_activities[act - 1]
-        df1 = changes[act]["before"]
-        df2 = changes[act]["after"]
+        activity = self.current_activities[act - 1]
         activity["runtime_exceptions"] = "No exceptions occurred"
-        activity_description, activity_code = (
-            activity["context"],
-            activity["code"],
-        )
-
+        self._activities.append(activity)
         debug(f"{activity['function_name']=}")
-        used_columns_string = used_columns_giver.give_columns(
-            df1, df2, activity_code, activity_description
-        )
+        used_columns_string = self._used_columns_answer(act, df1, df2)
         debug(f"{used_columns_string=}")
         used_cols = i_do_completely_trust_llms_thus_i_will_evaluate_their_code_on_my_machine(  # noqa
             used_columns_string
         )
         debug(f"{used_cols=}")
 
-        # Iterate over the columns and rows to find differences
-        unique_col_in_df1 = set(df1.columns) - set(df2.columns)
-        unique_col_in_df2 = set(df2.columns) - set(df1.columns)
+        # Find the differences with vectorized operations
+        if diff is None:
+            diff = FrameDiff(df1, df2, self._executor, row_ids)
+        if fingerprints is None:
+            fingerprints = self.fingerprints(act, df1, df2)
+        fp1, fp2 = fingerprints
+        self._fingerprints, self._last_act = fp2, act
+        # the dropped and new records, run-length encoded
+        deleted_rows = encode_labels(
+            "deleted_rows",
+            "deleted_row_labels",
+            df1.index[diff.dropped_rows],
+        )
+        activity.update(deleted_rows)
+        activity.update(
+            encode_labels(
+                "generated_rows",
+                "generated_row_labels",
+                df2.index[diff.new_rows],
+            )
+        )
+
         # if the column is exclusively in the "before" dataframe
-        unique_df1_col = list()
-        for col in unique_col_in_df1:
+        # fingerprint -> first dropped column with it, to detect renames
+        unique_df1_col = dict()
+        for col in diff.dropped_columns:
             # if the column already exist or create it
-            val_col = str(df1[col].tolist())
-            idx_col = str(df1.index.tolist())
-            new_column = None
-            if (val_col, idx_col, col) not in current_columns.keys():
-                new_column = create_column(val_col, idx_col, col)
-                current_columns[(val_col, idx_col, col)] = new_column
-            else:
-                new_column = current_columns[(val_col, idx_col, col)]
-            unique_df1_col.append(new_column)
-            used_columns.append(new_column["id"])
-            invalidated_columns.append(new_column["id"])
+            old_column, _ = self._column(fp1, col)
+            unique_df1_col.setdefault(old_column["fingerprint"], old_column)
+            used_columns.append(old_column["id"])
+            invalidated_columns.append(old_column["id"])
         # if the column is exclusively in the "after" dataframe
-        for col in unique_col_in_df2:
+        for col in diff.new_columns:
             # see if the column already exist or create it
-            val_col = str(df2[col].tolist())
-            idx_col = str(df2.index.tolist())
-            if (val_col, idx_col, col) not in current_columns.keys():
-                new_column = create_column(val_col, idx_col, col)
+            new_column, created = self._column(fp2, col)
+            if created:
                 generated_columns.append(new_column["id"])
-                current_columns[(val_col, idx_col, col)] = new_column
-                for column in unique_df1_col:
-                    if (
-                        new_column["index"] == column["index"]
-                        and new_column["value"] == column["value"]
-                    ):
-                        derivations_column.append(
-                            {
-                                "gen": str(new_column["id"]),
-                                "used": str(column["id"]),
-                            }
-                        )
-                        break
-        common_col = set(df1.columns).intersection(set(df2.columns))
-        for col in common_col:
-            new_column = None
-            used_column = None
+                column = unique_df1_col.get(new_column["fingerprint"], None)
+                if column is not None:
+                    derivations_column.append(
+                        {
+                            "gen": new_column["id"],
+                            "used": column["id"],
+                        }
+                    )
+        for col in diff.common_columns:
             if col in used_cols:
-                val_col = str(df1[col].tolist())
-                idx_col = str(df1.index.tolist())
-                if (val_col, idx_col, col) not in current_columns.keys():
-                    used_column = create_column(val_col, idx_col, col)
-                    current_columns[(val_col, idx_col, col)] = used_column
-                else:
-                    used_column = current_columns[(val_col, idx_col, col)]
-                if used_column:
-                    used_columns.append(used_column["id"])
-            for idx in df2.index:
-                if idx in df1.index:
-                    old_value = df1.at[idx, col]
-                else:
-                    old_value = "Not exist"
-                new_value = df2.at[idx, col]
-                if old_value != new_value:
-                    if is_number(old_value) and is_number(new_value):
-                        old_val = float(old_value)
-                        new_val = float(new_value)
-                        if math.isnan(new_val) and math.isnan(old_val):
-                            continue
-                    # if the column already exist or create it
-                    val_col = str(df2[col].tolist())
-                    idx_col = str(df2.index.tolist())
-                    if (val_col, idx_col, col) not in current_columns.keys():
-                        new_column = create_column(val_col, idx_col, col)
-                        generated_columns.append(new_column["id"])
-                        current_columns[(val_col, idx_col, col)] = new_column
-                    else:
-                        new_column = current_columns[(val_col, idx_col, col)]
+                used_column, _ = self._column(fp1, col)
+                used_columns.append(used_column["id"])
 
-                    if old_value != "Not exist":
-                        # same but for the before df, to get the used columns
-                        old_column = None
-                        val_old_col = str(df1[col].tolist())
-                        idx_old_col = str(df1.index.tolist())
-                        if (
-                            val_old_col,
-                            idx_old_col,
-                            col,
-                        ) not in current_columns.keys():
-                            old_column = create_column(
-                                val_old_col,
-                                idx_old_col,
-                                col,
-                            )
-                            current_columns[
-                                (val_old_col, idx_old_col, col)
-                            ] = old_column
-                        else:
-                            old_column = current_columns[
-                                (val_old_col, idx_old_col, col)
-                            ]
-                        if new_column and new_column["id"] != old_column["id"]:
-                            derivations_column.append(
-                                {
-                                    "gen": str(new_column["id"]),
-                                    "used": str(old_column["id"]),
-                                }
-                            )
-                        used_columns.append(old_column["id"])
-                        invalidated_columns.append(old_column["id"])
-                        break
-            unique_rows_in_df1 = set(df1.index) - set(df2.index)
-            for idx in unique_rows_in_df1:
-                if idx in df1.index and col in df1.columns:
-                    # the old column that with the unique row
-                    val_col = str(df1[col].tolist())
-                    idx_col = str(df1.index.tolist())
-                    if (val_col, idx_col, col) not in current_columns.keys():
-                        old_column = create_column(val_col, idx_col, col)
-                        current_columns[(val_col, idx_col, col)] = old_column
-                    else:
-                        old_column = current_columns[(val_col, idx_col, col)]
-                    current_columns[(val_col, idx_col, col)] = old_column
-                    used_columns.append(old_column["id"])
-                    invalidated_columns.append(old_column["id"])
-                    # the new column without the unique row
-                    val_new_col = str(df2[col].tolist())
-                    idx_new_col = str(df2.index.tolist())
-                    if (
-                        val_new_col,
-                        idx_new_col,
-                        col,
-                    ) not in current_columns.keys():
-                        new_column = create_column(
-                            val_new_col,
-                            idx_new_col,
-                            col,
-                        )
-                        current_columns[
-                            (
-                                val_new_col,
-                                idx_new_col,
-                                col,
-                            )
-                        ] = new_column
-                    else:
-                        new_column = current_columns[
-                            (
-                                val_new_col,
-                                idx_new_col,
-                                col,
-                            )
-                        ]
-                    current_columns[
-                        (
-                            val_new_col,
-                            idx_new_col,
-                            col,
-                        )
-                    ] = new_column
+            positions, old_positions = diff.changed_cells(col)
+            if len(positions) > 0:
+                # if the column already exist or create it
+                new_column, created = self._column(fp2, col)
+                if created:
                     generated_columns.append(new_column["id"])
-                    if new_column and new_column["id"] != old_column["id"]:
+                if (old_positions >= 0).any():
+                    # same but for the before df, to get the used columns
+                    old_column, _ = self._column(fp1, col)
+                    if new_column["id"] != old_column["id"]:
                         derivations_column.append(
                             {
-                                "gen": str(new_column["id"]),
-                                "used": str(old_column["id"]),
+                                "gen": new_column["id"],
+                                "used": old_column["id"],
                             }
                         )
-                    break
+                    used_columns.append(old_column["id"])
+                    invalidated_columns.append(old_column["id"])
+            if len(diff.dropped_rows) > 0:
+                # the old column that with the unique row
+                old_column, _ = self._column(fp1, col)
+                used_columns.append(old_column["id"])
+                invalidated_columns.append(old_column["id"])
+                # the new column without the unique row
+                new_column, created = self._column(fp2, col)
+                # only a column created by this activity records its
+                # deleted rows, the others may have been drained already
+                created = created or new_column["id"] in generated_columns
+                generated_columns.append(new_column["id"])
+                if new_column["id"] != old_column["id"]:
+                    if created:
+                        new_column.update(deleted_rows)
+                    derivations_column.append(
+                        {
+                            "gen": new_column["id"],
+                            "used": old_column["id"],
+                        }
+                    )
 
         current_relations_column.append(
             create_relation_column(
@@ -251,20 +178,45 @@ def column_vision(changes, current_activities, args):
             )
         )
 
-    # unified interface with column_entity_approach.column_entity_vision()
-    current_entities = dict()
-    current_relations = list()
-    derivations = list()
-    current_columns_to_entities = dict()
-    entities_to_keep = list()
+    def drain(self) -> Iterator[Record]:
+        """
+        Yield the records (see graph.records) found since the last
+        call and forget them, but for the columns which are needed to
+        diff the next steps.
+        """
+
+        yield from super().drain()
+        for derivation in self.derivations_column:
+            yield DerivationRecord(derivation, True)
+        self.derivations_column.clear()
+        for relation in self.current_relations_column:
+            yield RelationRecord(relation, True)
+        self.current_relations_column.clear()
+
+    def result(self):
+        # unified interface with column_entity_approach.column_entity_vision()
+        self.close()
+        current_entities = EntityTable()
+        current_relations = list()
+        derivations = list()
+        current_columns_to_entities = dict()
+        entities_to_keep = list()
+
+        return (
+            current_entities,
+            self.current_columns,
+            current_relations,
+            self.current_relations_column,
+            derivations,
+            self.derivations_column,
+            current_columns_to_entities,
+            entities_to_keep,
+        )
+
 
-    return (
-        current_entities,
-        current_columns,
-        current_relations,
-        current_relations_column,
-        derivations,
-        derivations_column,
-        current_columns_to_entities,
-        entities_to_keep,
+def column_vision(
+    changes, current_activities, args, used_columns_answers=None
+):
+    return ColumnVision.extract(
+        changes, current_activities, args, used_columns_answers
     )
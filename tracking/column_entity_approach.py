@@ -24,47 +24,80 @@
 # You should have received a copy of the GNU General Public License
 # along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
 
-from LLM.LLM_activities_used_columns import LLM_activities_used_columns
+from graph.entities import EntityTable
+from graph.records import (
+    DerivationRecord,
+    EntityRecord,
+    KeepRecord,
+    MembershipRecord,
+    Record,
+    RelationRecord,
+)
 from graph.structure import (
-    create_entity,
-    create_column,
     create_relation,
     create_relation_column,
+    create_rule,
 )
+from graph.rowsets import encode_labels
 from logging import debug
+from tracking.diff import FrameDiff, TRANSFORMATIONS
+from tracking.vision import Vision
+from typing import Iterator
 from utils import (
     i_do_completely_trust_llms_thus_i_will_evaluate_their_code_on_my_machine,
     keep_random_element_in_place,
 )
-import pandas as pd
+import numpy as np
+import random
+
 
+class ColumnEntityVision(Vision):
+    """
+    Entity-level provenance extractor
 
-def is_number(value):
-    try:
-        float(value)
-        return True
-    except ValueError:
-        return False
+    Each call to step() diffs the dataframes before/after an activity
+    and accumulates the entities, columns, derivations and relations
+    found; it can thus be fed either with the whole
+    ProvenanceTracker.changes afterwards, see column_entitiy_vision(),
+    or while the pipeline runs, see ProvenanceTracker(on_change=...).
+    """
 
+    def __init__(self, current_activities, args, used_columns_answers=None):
+        assert args.prov_entity_level
+        super().__init__(current_activities, args, used_columns_answers)
 
-def column_entitiy_vision(changes, current_activities, args):
-    assert args.prov_entity_level
+        # keeping current elements on the graph supporting the
+        # creation on neo4j
+        self.current_entities = EntityTable(self.ids)
+        self.entities_to_keep = list()
 
-    # keeping current elements on the graph supporting the creation on neo4j
-    current_entities = dict()
-    current_columns = dict()
+        # find the differnce of the df and create the entities
+        self.derivations = list()
+        self.derivations_column = list()
+        self.current_relations = list()
+        self.current_relations_column = list()
+        self.current_columns_to_entities = dict()
+        # how many entities were already yielded by drain()
+        self._drained_entities = 0
+        # the entities which can still be created under --budget, if any
+        self._budget = args.budget
 
-    used_columns_giver = LLM_activities_used_columns()
-    # keeping current elements on the graph supporting the creation on neo4j
-    entities_to_keep = list()
+    def step(self, act, df1, df2, row_ids=None, diff=None, fingerprints=None):
+        """
+        Find the differences between df1 and df2, i.e. the dataframes
+        before and after the act-th activity, whose rows are matched
+        by their row_ids when given (see SnapshotStore.row_ids());
+        their FrameDiff and Fingerprints (see fingerprints()) can be
+        given as well, e.g. when shared by several visions
+        """
+        if act == 0:
+            return  # subscribe() is followed by an analyze_changes()
+        args = self.args
+        entities_to_keep = self.entities_to_keep
+        derivations = self.derivations
+        derivations_column = self.derivations_column
+        columns_to_entities = self.current_columns_to_entities
 
-    # find the differnce of the df and create the entities
-    derivations = list()
-    derivations_column = list()
-    current_relations = list()
-    current_relations_column = list()
-    current_columns_to_entities = dict()
-    for act in changes.keys():
         used_cols = None
         generated_entities = list()
         used_entities = list()
@@ -72,295 +105,266 @@ def column_entitiy_vision(changes, current_activities, args):
         generated_columns = list()
         used_columns = list()
         invalidated_columns = list()
-        if act == 0:
-            continue
-        activity = current_activities[act - 1]
-        df1 = changes[act]["before"]
-        df2 = changes[act]["after"]
+        activity = self.current_activities[act - 1]
         activity["runtime_exceptions"] = "No exceptions occurred"
+        self._activities.append(activity)
 
-        activity_description, activity_code = (
-            activity["context"],
-            activity["code"],
-        )
         debug(f"{activity['function_name']=}")
-        used_columns_string = used_columns_giver.give_columns(
-            df1, df2, activity_code, activity_description
-        )
+        used_columns_string = self._used_columns_answer(act, df1, df2)
         debug(f"{used_columns_string=}")
         used_cols = i_do_completely_trust_llms_thus_i_will_evaluate_their_code_on_my_machine(  # noqa
             used_columns_string
         )
         debug(f"{used_cols=}")
 
-        # Approach working when the number of rows is the same and
-        # the number of columns increase or is the same
-        # if len(df1.columns) <= len(df2.columns):
+        # Find the differences with vectorized operations, then loop
+        # just over the changed cells
+        if diff is None:
+            diff = FrameDiff(df1, df2, self._executor, row_ids)
+        if fingerprints is None:
+            fingerprints = self.fingerprints(act, df1, df2)
+        fp1, fp2 = fingerprints
+        self._fingerprints, self._last_act = fp2, act
+        labels1, labels2 = list(df1.index), list(df2.index)
+        level, compact, row_sets = self._granularity(act, diff)
+        if args.budget is not None:
+            activity["granularity_level"] = level
+        entities_before = len(self.current_entities)
+        # at granularity level 1 just a random generated and a random
+        # used cell are kept, thus the candidate cells are collected
+        # (column by column) and only the sampled ones become entities
+        sample = level == 1
+        gen_cells, used_cells = list(), list()
+        # the dropped and new records, run-length encoded
+        deleted_rows = encode_labels(
+            "deleted_rows",
+            "deleted_row_labels",
+            df1.index[diff.dropped_rows],
+        )
+        activity.update(deleted_rows)
+        activity.update(
+            encode_labels(
+                "generated_rows",
+                "generated_row_labels",
+                df2.index[diff.new_rows],
+            )
+        )
 
-        # Iterate over the columns and rows to find differences
-        unique_col_in_df1 = set(df1.columns) - set(df2.columns)
-        unique_col_in_df2 = set(df2.columns) - set(df1.columns)
         # if the column is exclusively in the "before" dataframe
-        unique_df1_col = list()
-        for col in unique_col_in_df1:
+        # fingerprint -> first dropped column with it, to detect renames
+        unique_df1_col = dict()
+        for col in diff.dropped_columns:
             # control il the column already exist or create it
-            val_col = str(df1[col].tolist())
-            idx_col = str(df1.index.tolist())
-            new_column = None
-            if (val_col, idx_col, col) not in current_columns.keys():
-                new_column = create_column(val_col, idx_col, col)
-                current_columns[(val_col, idx_col, col)] = new_column
-                current_columns_to_entities[new_column["id"]] = list()
-            else:
-                new_column = current_columns[(val_col, idx_col, col)]
-            unique_df1_col.append(new_column)
-            used_columns.append(new_column["id"])
-            invalidated_columns.append(new_column["id"])
-            for idx in df1.index:
-                old_value = df1.at[idx, col]
-                old_entity = None
-                if (old_value, col, idx) in current_entities.keys():
-                    old_entity = current_entities[(old_value, col, idx)]
-                else:
-                    old_entity = create_entity(old_value, col, idx)
-                    current_entities[(old_value, col, idx)] = old_entity
-                invalidated_entities.append(old_entity["id"])
-                used_entities.append(old_entity["id"])
-                current_columns_to_entities[new_column["id"]].append(  #
-                    old_entity["id"]
-                )
+            old_column, _ = self._column(fp1, col)
+            unique_df1_col.setdefault(old_column["fingerprint"], old_column)
+            used_columns.append(old_column["id"])
+            invalidated_columns.append(old_column["id"])
+            if sample:
+                used_cells.append((old_column, col, np.arange(len(labels1))))
+                continue
+            old_entities = [
+                self._entity(old_value, col, idx)
+                for old_value, idx in zip(df1[col].to_numpy(), labels1)
+            ]
+            invalidated_entities.extend(old_entities)
+            used_entities.extend(old_entities)
+            columns_to_entities[old_column["id"]].extend(old_entities)
+
         # if the column is exclusively in the "after" dataframe
-        for col in unique_col_in_df2:
+        for col in diff.new_columns:
             # control il the column already exist or create it
-            val_col = str(df2[col].tolist())
-            idx_col = str(df2.index.tolist())
+            new_column, created = self._column(fp2, col)
             old_col = None
-            if (val_col, idx_col, col) not in current_columns.keys():
-                new_column = create_column(val_col, idx_col, col)
+            if created:
                 generated_columns.append(new_column["id"])
-                current_columns[(val_col, idx_col, col)] = new_column
-                current_columns_to_entities[new_column["id"]] = list()
-                for column in unique_df1_col:
-                    if (
-                        new_column["index"] == column["index"]
-                        and new_column["value"] == column["value"]
-                    ):
-                        derivations_column.append(
-                            {
-                                "gen": str(new_column["id"]),
-                                "used": str(column["id"]),
-                            }
-                        )
-                        old_col = column["name"]
-                        break
-            for idx in df2.index:
-                new_value = df2.at[idx, col]
-                new_entity = create_entity(new_value, col, idx)
-                if old_col and df1.at[idx, old_col]:
-                    old_value = df1.at[idx, old_col]
-                    old_entity = current_entities[(old_value, old_col, idx)]
-                    derivations.append(
+                column = unique_df1_col.get(new_column["fingerprint"], None)
+                if column is not None:
+                    derivations_column.append(
                         {
-                            "gen": str(new_entity["id"]),
-                            "used": str(old_entity["id"]),
+                            "gen": new_column["id"],
+                            "used": column["id"],
                         }
                     )
-                current_entities[(new_value, col, idx)] = new_entity
-                generated_entities.append(new_entity["id"])
-                current_columns_to_entities[new_column["id"]].append(  #
-                    new_entity["id"]
+                    old_col = column["instance"]
+            if sample:
+                gen_cells.append(
+                    (
+                        new_column,
+                        col,
+                        np.arange(len(labels2)),
+                        old_col,
+                        diff.row_positions,
+                    )
                 )
+                continue
+            if old_col is not None:
+                old_values = diff.aligned_values(old_col)
+            for pos, (new_value, idx) in enumerate(
+                zip(df2[col].to_numpy(), labels2)
+            ):
+                new_entity = self.current_entities.add(new_value, col, idx)
+                old_pos = diff.row_positions[pos]
+                if old_col is not None and old_pos >= 0:
+                    old_entity = self._entity(
+                        old_values[pos], old_col, labels1[old_pos]
+                    )
+                    derivations.append({"gen": new_entity, "used": old_entity})
+                generated_entities.append(new_entity)
+                columns_to_entities[new_column["id"]].append(new_entity)
 
-        common_col = set(df1.columns).intersection(set(df2.columns))
-        for col in common_col:
-            new_column = None
-
+        for col in diff.common_columns:
             # verify if a column is used and in that case add it to
             # used columns
-            used_column = None
             if col in used_cols:
-                val_col = str(df1[col].tolist())
-                idx_col = str(df1.index.tolist())
-                if (val_col, idx_col, col) not in current_columns.keys():
-                    used_column = create_column(val_col, idx_col, col)
-                    current_columns[(val_col, idx_col, col)] = used_column
-                    current_columns_to_entities[used_column["id"]] = list()
-                else:
-                    used_column = current_columns[(val_col, idx_col, col)]
-                if used_column:
-                    used_columns.append(used_column["id"])
-
-            for idx in df2.index:
-                if idx in df1.index:
-                    old_value = df1.at[idx, col]
-                else:
-                    old_value = "Not exist"
-                new_value = df2.at[idx, col]
-
-                if old_value != new_value:
-                    if is_number(old_value) and is_number(new_value):
-                        old_val = float(old_value)
-                        new_val = float(new_value)
-                        if pd.isna(new_val) and pd.isna(old_val):
-                            continue
-                    if (new_value, col, idx) in current_entities:
-                        continue
+                used_column, _ = self._column(fp1, col)
+                used_columns.append(used_column["id"])
+
+            new_column, old_column = None, None
+            old_values, new_values = df1[col].to_numpy(), df2[col].to_numpy()
+            positions, old_positions = diff.changed_cells(col)
+            # a cast/strip/map of the whole column is recorded as a rule
+            # of the column derivation, and only the cells not following
+            # it (i.e. its exceptions) get their own entities
+            transformation = (
+                diff.transformation(col, compact) if compact else None
+            )
+            if transformation is not None:
+                exceptions = transformation.pop("exceptions")
+                new_column, created = self._column(fp2, col)
+                if created:
+                    generated_columns.append(new_column["id"])
+                old_column, _ = self._column(fp1, col)
+                if new_column["id"] != old_column["id"]:
+                    derivations_column.append(
+                        {
+                            "gen": new_column["id"],
+                            "used": old_column["id"],
+                            "rule": create_rule(
+                                feature_name=col,
+                                rows=df2.index[positions[~exceptions]],
+                                exceptions=df2.index[positions[exceptions]],
+                                ids=self.ids,
+                                **transformation,
+                            ),
+                        }
+                    )
+                used_columns.append(old_column["id"])
+                invalidated_columns.append(old_column["id"])
+                positions = positions[exceptions]
+                old_positions = old_positions[exceptions]
+            cells = zip(positions.tolist(), old_positions.tolist())
+            if sample:
+                # a single cell is enough to get the columns
+                cells = (
+                    [(positions[0], old_positions.max())]
+                    if len(positions) > 0
+                    else list()
+                )
+            for pos, old_pos in cells:
+                new_value, idx = new_values[pos], labels2[pos]
+                if (
+                    not sample
+                    and (new_value, col, idx) in self.current_entities
+                ):
+                    continue
+                if new_column is None:
                     # control il the column already exist or create it
-                    val_col = str(df2[col].tolist())
-                    idx_col = str(df2.index.tolist())
-                    if (val_col, idx_col, col) not in current_columns.keys():
-                        new_column = create_column(val_col, idx_col, col)
+                    new_column, created = self._column(fp2, col)
+                    if created:
                         generated_columns.append(new_column["id"])
-                        current_columns[(val_col, idx_col, col)] = new_column
-                        current_columns_to_entities[new_column["id"]] = list()
-                    else:
-                        new_column = current_columns[(val_col, idx_col, col)]
-
-                    entity = create_entity(new_value, col, idx)
-                    if old_value != "Not exist":
-                        # same control but for the before df, to get
-                        # the used columns
-                        old_column = None
-                        val_old_col = str(df1[col].tolist())
-                        idx_old_col = str(df1.index.tolist())
-                        if (
-                            val_old_col,
-                            idx_old_col,
-                            col,
-                        ) not in current_columns.keys():
-                            old_column = create_column(
-                                val_old_col,
-                                idx_old_col,
-                                col,
-                            )
-                            current_columns[
-                                (val_old_col, idx_old_col, col)
-                            ] = old_column
-                            current_columns_to_entities[old_column["id"]] = (
-                                list()
-                            )
-                        else:
-                            old_column = current_columns[
-                                (val_old_col, idx_old_col, col)
-                            ]
-                        if new_column and new_column["id"] != old_column["id"]:
-                            derivations_column.append(
-                                {
-                                    "gen": str(new_column["id"]),
-                                    "used": str(old_column["id"]),
-                                }
-                            )
-                        used_columns.append(old_column["id"])
-                        invalidated_columns.append(old_column["id"])
-                        old_entity = None
-                        if (old_value, col, idx) in current_entities.keys():
-                            old_entity = current_entities[
-                                (
-                                    old_value,
-                                    col,
-                                    idx,
-                                )
-                            ]
-                        else:
-                            old_entity = create_entity(old_value, col, idx)
-                            current_entities[
-                                (
-                                    old_value,
-                                    col,
-                                    idx,
-                                )
-                            ] = old_entity
-                        derivations.append(
+                if old_pos >= 0 and old_column is None:
+                    # same control but for the before df, to get the
+                    # used columns
+                    old_column, _ = self._column(fp1, col)
+                    if new_column["id"] != old_column["id"]:
+                        derivations_column.append(
                             {
-                                "gen": str(entity["id"]),
-                                "used": str(old_entity["id"]),
+                                "gen": new_column["id"],
+                                "used": old_column["id"],
                             }
                         )
-                        used_entities.append(old_entity["id"])
-                        invalidated_entities.append(old_entity["id"])
-                        current_columns_to_entities[old_column["id"]].append(
-                            old_entity["id"]
-                        )
-                    generated_entities.append(entity["id"])
-                    current_entities[(new_value, col, idx)] = entity
-                    current_columns_to_entities[new_column["id"]].append(  #
-                        entity["id"]
+                    used_columns.append(old_column["id"])
+                    invalidated_columns.append(old_column["id"])
+                if sample:
+                    continue
+
+                entity = self.current_entities.add(new_value, col, idx)
+                if old_pos >= 0:
+                    old_entity = self._entity(
+                        old_values[old_pos], col, labels1[old_pos]
                     )
-        # # Iterate over the columns and rows to find differences
-        unique_rows_in_df1 = set(df1.index) - set(df2.index)
-        if len(unique_rows_in_df1) > 0:
+                    derivations.append({"gen": entity, "used": old_entity})
+                    used_entities.append(old_entity)
+                    invalidated_entities.append(old_entity)
+                    columns_to_entities[old_column["id"]].append(old_entity)
+                generated_entities.append(entity)
+                columns_to_entities[new_column["id"]].append(entity)
+            if sample and new_column is not None:
+                gen_cells.append(
+                    (new_column, col, positions, col, old_positions)
+                )
+            if sample and old_column is not None:
+                used_cells.append(
+                    (old_column, col, old_positions[old_positions >= 0])
+                )
+
+        # the rows exclusively in the "before" dataframe
+        if len(diff.dropped_rows) > 0:
+            dropped_rows = diff.dropped_rows.tolist()
+            # only a column created by this activity records its deleted
+            # rows, the others may have been drained already
+            created_columns = set(generated_columns)
             for col in df2.columns:
                 # control il the column already exist or create it
-                val_col = str(df2[col].tolist())
-                idx_col = str(df2.index.tolist())
-                new_column = None
-                if (val_col, idx_col, col) not in current_columns.keys():
-                    new_column = create_column(val_col, idx_col, col)
-                    current_columns[(val_col, idx_col, col)] = new_column
-                    current_columns_to_entities[new_column["id"]] = list()
+                new_column, created = self._column(fp2, col)
+                if created:
                     generated_columns.append(new_column["id"])
-                else:
-                    new_column = current_columns[(val_col, idx_col, col)]
-
-                for idx in unique_rows_in_df1:
-                    if idx in df1.index and col in df1.columns:
-                        val_col = str(df1[col].tolist())
-                        idx_col = str(df1.index.tolist())
-                        old_column = None
-                        if (
-                            val_col,
-                            idx_col,
-                            col,
-                        ) not in current_columns.keys():
-                            old_column = create_column(val_col, idx_col, col)
-                            current_columns[
-                                (
-                                    val_col,
-                                    idx_col,
-                                    col,
-                                )
-                            ] = old_column
-                            current_columns_to_entities[old_column["id"]] = (
-                                list()
-                            )
-                        else:
-                            old_column = current_columns[
-                                (
-                                    val_col,
-                                    idx_col,
-                                    col,
-                                )
-                            ]
-                        old_value = df1.at[idx, col]
-                        old_entity = create_entity(
-                            old_value,
-                            df1.columns[df2.columns.get_loc(col)],
-                            idx,
-                        )
-                        current_entities[
-                            (
-                                old_value,
-                                df1.columns[df2.columns.get_loc(col)],
-                                idx,
-                            )
-                        ] = old_entity
-                        current_columns[(val_col, idx_col, col)] = old_column
-                        used_columns.append(old_column["id"])
-                        invalidated_columns.append(old_column["id"])
-                        if new_column and new_column["id"] != old_column["id"]:
-                            derivations_column.append(
-                                {
-                                    "gen": str(new_column["id"]),
-                                    "used": str(old_column["id"]),
-                                }
-                            )
-                        used_entities.append(old_entity["id"])
-                        invalidated_entities.append(old_entity["id"])
-                        current_columns_to_entities[old_column["id"]].append(
-                            old_entity["id"]
-                        )
+                    created_columns.add(new_column["id"])
+                if col not in df1.columns:
+                    continue
+
+                old_column, _ = self._column(fp1, col)
+                used_columns.append(old_column["id"])
+                invalidated_columns.append(old_column["id"])
+                if new_column["id"] != old_column["id"]:
+                    if new_column["id"] in created_columns:
+                        new_column.update(deleted_rows)
+                    derivations_column.append(
+                        {
+                            "gen": new_column["id"],
+                            "used": old_column["id"],
+                        }
+                    )
+                if sample:
+                    used_cells.append((old_column, col, diff.dropped_rows))
+                    continue
+                if row_sets:
+                    # the records are on the activity/column row sets
+                    continue
+                old_values = df1[col].to_numpy()
+                old_entities = [
+                    self._entity(old_values[pos], col, labels1[pos])
+                    for pos in dropped_rows
+                ]
+                used_entities.extend(old_entities)
+                invalidated_entities.extend(old_entities)
+                columns_to_entities[old_column["id"]].extend(old_entities)
 
-        if args.granularity_level in (1, 2):
+        if sample:
+            gen_element, used_elem = self._sample_cells(
+                df1, df2, gen_cells, used_cells
+            )
+            for elem, entities in (
+                (gen_element, generated_entities),
+                (used_elem, used_entities),
+                (used_elem, invalidated_entities),
+            ):
+                if elem is not None:
+                    entities.append(elem)
+            entities_to_keep.extend(
+                elem for elem in (gen_element, used_elem) if elem is not None
+            )
+        elif level == 2:
             gen_element = keep_random_element_in_place(generated_entities)
             inv_elem = None
             if gen_element:
@@ -376,7 +380,7 @@ def column_entitiy_vision(changes, current_activities, args):
             if inv_elem:
                 entities_to_keep.append(inv_elem)
 
-        current_relations_column.append(
+        self.current_relations_column.append(
             create_relation_column(
                 activity["id"],
                 generated_columns,
@@ -385,7 +389,7 @@ def column_entitiy_vision(changes, current_activities, args):
                 same=False,
             )
         )
-        current_relations.append(
+        self.current_relations.append(
             create_relation(
                 activity["id"],
                 generated_entities,
@@ -394,15 +398,182 @@ def column_entitiy_vision(changes, current_activities, args):
                 same=False,
             )
         )
+        if self._budget is not None:
+            self._budget -= len(self.current_entities) - entities_before
+
+    def _granularity(self, act, diff):
+        """
+        Return the granularity level, the transformations to record as
+        rules (see FrameDiff.transformation()) and whether to record
+        the dropped rows just as row sets, for the act-th activity.
+
+        They are the ones of the command line unless a --budget of
+        entities is given: then the budget left is shared among the
+        activities left and each one gets the finest provenance whose
+        estimated entities fit its share, i.e. the given one, the one
+        compacted by rules and row sets or a sampled one (level 1).
+        Cheap activities thus leave more budget to the following ones.
+        """
+
+        args = self.args
+        ret = (args.granularity_level, args.compact, args.row_sets)
+        if self._budget is None or args.granularity_level == 1:
+            return ret
+        share = max(0, self._budget) // max(
+            1, len(self.current_activities) - act + 1
+        )
+        for granularity in (
+            ret,
+            (args.granularity_level, TRANSFORMATIONS, True),
+        ):
+            cost = self._cost(diff, *granularity[1:])
+            debug(f"{act=} {granularity=} {cost=} {share=}")
+            if cost <= share:
+                return granularity
+        return (1, TRANSFORMATIONS, True)
+
+    def _cost(self, diff, compact, row_sets) -> int:
+        """
+        Estimate from the change masks of a FrameDiff the number of
+        entities created by step() (i.e. not sampling), an upper bound
+        since the existing entities are not looked up.
+        """
+
+        ret = len(diff.df1.index) * len(diff.dropped_columns)
+        ret += len(diff.df2.index) * len(diff.new_columns)
+        for col in diff.common_columns:
+            positions, old_positions = diff.changed_cells(col)
+            transformation = (
+                diff.transformation(col, compact) if compact else None
+            )
+            if transformation is not None:
+                old_positions = old_positions[transformation["exceptions"]]
+            # a new entity for each changed cell, and one for its old value
+            ret += len(old_positions) + int((old_positions >= 0).sum())
+        if not row_sets:
+            ret += len(diff.dropped_rows) * len(diff.common_columns)
+        return ret
+
+    def _column(self, fingerprints, col):
+        column, created = super()._column(fingerprints, col)
+        if created:
+            self.current_columns_to_entities[column["id"]] = list()
+        return column, created
+
+    def _sample_cells(self, df1, df2, gen_cells, used_cells):
+        """
+        Pick uniformly at random a generated and a used cell among the
+        candidate ones, create their entities and return their IDs (or
+        None when there are no candidates).
+
+        :param gen_cells: (column, col, positions in df2, source col or
+                          None, positions in df1 of the source cells)
+        :param used_cells: (column, col, positions in df1)
+        """
+
+        gen_element, used_elem = None, None
+        group, i = _pick(gen_cells)
+        if group is not None:
+            column, col, positions, old_col, old_positions = group
+            pos, old_pos = positions[i], old_positions[i]
+            gen_element = self.current_entities.add(
+                df2[col].to_numpy()[pos], col, df2.index[pos]
+            )
+            self.current_columns_to_entities[column["id"]].append(gen_element)
+            if old_col is not None and old_pos >= 0:
+                old_entity = self._entity(
+                    df1[old_col].to_numpy()[old_pos],
+                    old_col,
+                    df1.index[old_pos],
+                )
+                self.derivations.append(
+                    {"gen": gen_element, "used": old_entity}
+                )
+
+        group, i = _pick(used_cells)
+        if group is not None:
+            column, col, positions = group
+            pos = positions[i]
+            used_elem = self._entity(
+                df1[col].to_numpy()[pos], col, df1.index[pos]
+            )
+            self.current_columns_to_entities[column["id"]].append(used_elem)
+        return gen_element, used_elem
+
+    def _entity(self, value, col, idx):
+        """Return the entity ID of a cell, creating it if not existing"""
+        return self.current_entities.get_or_add(value, col, idx)
+
+    def drain(self) -> Iterator[Record]:
+        """
+        Yield the records (see graph.records) found since the last
+        call and forget them, but for the entities and columns which
+        are needed to diff the next steps; memory thus stays bounded
+        by the number of distinct cells and columns.
+        """
+
+        yield from super().drain()
+        for i in range(self._drained_entities, len(self.current_entities)):
+            yield EntityRecord(self.current_entities.row(i))
+        self._drained_entities = len(self.current_entities)
+
+        for derivations, columns in (
+            (self.derivations, False),
+            (self.derivations_column, True),
+        ):
+            for derivation in derivations:
+                yield DerivationRecord(derivation, columns)
+            derivations.clear()
+        for relations, columns in (
+            (self.current_relations, False),
+            (self.current_relations_column, True),
+        ):
+            for relation in relations:
+                yield RelationRecord(relation, columns)
+            relations.clear()
+        for column, entities in self.current_columns_to_entities.items():
+            if entities:
+                yield MembershipRecord(column, list(entities))
+                entities.clear()
+        for entity in self.entities_to_keep:
+            yield KeepRecord(entity)
+        self.entities_to_keep.clear()
+
+    def result(self):
+        # unified interface with column_approach.column_vision()
+        self.close()
+        return (
+            self.current_entities,
+            self.current_columns,
+            self.current_relations,
+            self.current_relations_column,
+            self.derivations,
+            self.derivations_column,
+            self.current_columns_to_entities,
+            self.entities_to_keep,
+        )
+
+
+def _pick(groups):
+    """
+    Pick uniformly at random one of the cells in the groups, each one
+    having its positions as third element; return the group and the
+    index of the cell in it, or (None, None) if there are no cells.
+    """
+
+    sizes = [len(group[2]) for group in groups]
+    if sum(sizes) == 0:
+        return None, None
+    k = random.randrange(sum(sizes))
+    for group, size in zip(groups, sizes):
+        if k < size:
+            return group, k
+        k -= size
+
 
-    # unified interface with column_approach.column_vision()
-    return (
-        current_entities,
-        current_columns,
-        current_relations,
-        current_relations_column,
-        derivations,
-        derivations_column,
-        current_columns_to_entities,
-        entities_to_keep,
+def column_entitiy_vision(
+    changes, current_activities, args, used_columns_answers=None
+):
+    return ColumnEntityVision.extract(
+        changes, current_activities, args, used_columns_answers
     )
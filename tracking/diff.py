@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from logging import debug
+from typing import Optional
+import numpy as np
+import os
+import pandas as pd
+
+#: Frames with fewer rows are always diffed by the calling thread
+PARALLEL_MIN_ROWS = 1 << 14
+
+#: Patterns recognized by FrameDiff.transformation()
+TRANSFORMATIONS = ("cast", "strip", "map")
+
+
+def changed_mask(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """
+    Compare two aligned arrays of values and return a boolean mask of
+    the changed ones; missing values (NaN, None, NaT, NA) are equal to
+    each other and different from anything else.
+    """
+
+    numeric = "biuf"
+    if old.dtype.kind not in numeric or new.dtype.kind not in numeric:
+        if old.dtype != new.dtype or old.dtype.kind not in "mM":
+            old, new = old.astype(object), new.astype(object)
+
+    old_na, new_na = pd.isna(old), pd.isna(new)
+    ret = old_na != new_na
+    both = ~(old_na | new_na)
+    if both.all():
+        ret = np.asarray(old != new, dtype=bool)
+    elif both.any():
+        ret[both] = np.asarray(old[both] != new[both], dtype=bool)
+    return ret
+
+
+def _available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # e.g. macOS
+        return os.cpu_count() or 1
+
+
+def diff_pool(workers: int) -> Optional[Executor]:
+    """
+    Return a pool of workers for FrameDiff, or None when workers <= 1
+    or a single CPU is available (the diff is then serial); workers
+    are threads, since NumPy releases the GIL while comparing numeric
+    arrays, so that no column has to be copied to them.
+    """
+
+    if workers is None or workers <= 1:
+        return None
+    cpus = _available_cpus()
+    if cpus <= 1:
+        debug("diffing serially: a single CPU is available")
+        return None
+    return ThreadPoolExecutor(min(workers, cpus), thread_name_prefix="diff")
+
+
+def _changed_rows(old, new, row_positions) -> np.ndarray:
+    present = row_positions >= 0
+    changed = ~present
+    changed[present] = changed_mask(old[row_positions[present]], new[present])
+    return np.flatnonzero(changed)
+
+
+def _occurrences(index: pd.Index) -> pd.Index:
+    """Tell duplicated labels apart by their order of occurrence"""
+    labels = pd.Series(index, copy=False)
+    return pd.MultiIndex.from_arrays(
+        [
+            index,
+            labels.groupby(labels, dropna=False, sort=False).cumcount(),
+        ]
+    )
+
+
+def match_rows(
+    index1: pd.Index,
+    index2: pd.Index,
+    hashes1: Optional[np.ndarray] = None,
+    hashes2: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Match the rows of two dataframes and return, for each row of the
+    second one, the position of the same row in the first one (or -1).
+
+    Without hashes rows are matched by index label (duplicated labels
+    by order of occurrence).  Given the hashes of the rows values (see
+    pd.util.hash_pandas_object()), rows keeping both label and values
+    are matched first, then the remaining ones by values (e.g. after
+    a reset_index() or a sort) and lastly by label (i.e. the rows
+    whose values changed).
+    """
+
+    if index1.is_unique and index2.is_unique:
+        by_label = index1.get_indexer(index2)
+    else:
+        by_label = _occurrences(index1).get_indexer(_occurrences(index2))
+    if hashes1 is None or hashes2 is None:
+        return by_label
+
+    same = by_label >= 0
+    same[same] = hashes1[by_label[same]] == hashes2[same]
+    ret = np.where(same, by_label, -1)
+    free = np.ones(len(index1), dtype=bool)  # rows of df1 not matched yet
+    free[ret[same]] = False
+
+    todo = np.flatnonzero(~same)
+    if len(todo) > 0 and free.any():
+        candidates = np.flatnonzero(free)
+        found = _occurrences(pd.Index(hashes1[candidates])).get_indexer(
+            _occurrences(pd.Index(hashes2[todo]))
+        )
+        ret[todo[found >= 0]] = candidates[found[found >= 0]]
+        free[candidates[found[found >= 0]]] = False
+
+    rest = (ret < 0) & (by_label >= 0)
+    rest[rest] = free[by_label[rest]]
+    ret[rest] = by_label[rest]
+    return ret
+
+
+class FrameDiff:
+    """
+    Differences between the dataframes before/after an activity.
+
+    Rows are aligned by their row ids when given (see
+    SnapshotStore.row_ids()), otherwise by index label (duplicated
+    labels by order of occurrence), and columns by name; everything
+    is computed with
+    NumPy/Pandas vectorized operations and returned as arrays of
+    positions, so that callers only loop over what actually changed.
+
+    When an executor (see diff_pool()) is given, the numeric common
+    columns of large frames are diffed by its workers, while the other
+    columns are diffed by the calling thread in the meantime.
+
+    :param df1: The dataframe before the activity.
+    :param df2: The dataframe after the activity.
+    :param executor: An optional pool of workers.
+    :param row_ids: The row ids of df1 and df2, if any.
+    """
+
+    def __init__(
+        self,
+        df1: pd.DataFrame,
+        df2: pd.DataFrame,
+        executor: Optional[Executor] = None,
+        row_ids: Optional[tuple[np.ndarray, np.ndarray]] = None,
+    ) -> None:
+        self.df1 = df1
+        self.df2 = df2
+
+        columns1, columns2 = set(df1.columns), set(df2.columns)
+        self.dropped_columns = [c for c in df1.columns if c not in columns2]
+        self.new_columns = [c for c in df2.columns if c not in columns1]
+        self.common_columns = [c for c in df2.columns if c in columns1]
+
+        # for each row of df2 its position in df1, or -1
+        if row_ids is not None:
+            self.row_positions = pd.Index(row_ids[0]).get_indexer(row_ids[1])
+        else:
+            self.row_positions = match_rows(df1.index, df2.index)
+        self.new_rows = np.flatnonzero(self.row_positions < 0)
+        kept = np.zeros(len(df1.index), dtype=bool)
+        kept[self.row_positions[self.row_positions >= 0]] = True
+        # positions in df1 of the rows missing from df2
+        self.dropped_rows = np.flatnonzero(~kept)
+
+        self._changed_cells = dict()
+        self._transformations = dict()
+        self._pending = dict()  # column -> future of its changed cells
+        if executor is not None and len(df2.index) >= PARALLEL_MIN_ROWS:
+            self._submit(executor)
+
+    def changed_cells(self, col) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the cells of a common column whose value changed.
+
+        :param col: The name of a column both in df1 and df2.
+        :return: The positions of the changed cells in df2 and the
+                 positions of the same rows in df1 (-1 for new rows).
+        """
+
+        if col in self._pending:
+            positions = self._pending.pop(col).result()
+            self._changed_cells[col] = (
+                positions,
+                self.row_positions[positions],
+            )
+        if col not in self._changed_cells:
+            positions = _changed_rows(
+                self.df1[col].to_numpy(),
+                self.df2[col].to_numpy(),
+                self.row_positions,
+            )
+            self._changed_cells[col] = (
+                positions,
+                self.row_positions[positions],
+            )
+        return self._changed_cells[col]
+
+    def transformation(
+        self, col, kinds=TRANSFORMATIONS, tolerance=0.1
+    ) -> Optional[dict]:
+        """
+        Recognize the rule by which the changed cells of a common
+        column were transformed:
+
+        - cast: they are the old values converted to the new dtype
+          (e.g. astype());
+        - strip: they are the old strings without leading/trailing
+          whitespace (e.g. str.strip());
+        - map: each old value became the same new value, and there
+          are at least twice as many cells as distinct old values
+          (e.g. replace() with a mapping table).
+
+        Cells not following the rule (new rows included) are its
+        exceptions, which can be at most a tolerance fraction of the
+        changed cells; the rule with the fewest exceptions is chosen.
+        Rules are recognized once per column, kinds and tolerance.
+
+        :param col: The name of a column both in df1 and df2.
+        :param kinds: The rules to look for, in order.
+        :param tolerance: The maximum fraction of exceptions.
+        :return: None or a dictionary with the "transformation" kind,
+                 the new "dtype" (cast) or the "mapping" (map), and
+                 the boolean mask of the "exceptions" among the
+                 changed cells.
+        """
+
+        key = (col, tuple(kinds), tolerance)
+        if key not in self._transformations:
+            self._transformations[key] = self._transformation(*key)
+        ret = self._transformations[key]
+        return dict(ret) if ret is not None else None
+
+    def _transformation(self, col, kinds, tolerance) -> Optional[dict]:
+        positions, old_positions = self.changed_cells(col)
+        present = old_positions >= 0
+        max_exceptions = int(tolerance * len(positions))
+        if len(positions) == 0 or (~present).sum() > max_exceptions:
+            return None
+        old = self.df1[col].iloc[old_positions[present]]
+        new = self.df2[col].iloc[positions[present]]
+        best = None
+        for kind in kinds:
+            ret = {"transformation": kind}
+            try:
+                if kind == "cast" and old.dtype != new.dtype:
+                    expected = old.astype(new.dtype).to_numpy()
+                    ret["dtype"] = str(new.dtype)
+                elif kind == "strip" and pd.api.types.infer_dtype(
+                    old, skipna=False
+                ) in ("string", "mixed"):
+                    expected = old.astype(object).str.strip().to_numpy()
+                elif kind == "map":
+                    # the most frequent new value of each old value
+                    pairs = (
+                        pd.DataFrame(
+                            {"old": old.to_numpy(), "new": new.to_numpy()}
+                        )
+                        .value_counts(dropna=False)
+                        .reset_index()
+                        .drop_duplicates("old")
+                    )
+                    if 2 * len(pairs) > len(old):
+                        continue
+                    expected = (
+                        pairs["new"]
+                        .to_numpy()
+                        .take(pd.Index(pairs["old"]).get_indexer(old))
+                    )
+                    ret["mapping"] = repr(
+                        dict(zip(pairs["old"], pairs["new"]))
+                    )
+                else:
+                    continue
+                deviating = changed_mask(expected, new.to_numpy())
+            except (TypeError, ValueError):  # e.g. unhashable/uncastable
+                continue
+            if (~present).sum() + deviating.sum() <= max_exceptions:
+                # keep the rule with the fewest exceptions
+                max_exceptions = (~present).sum() + deviating.sum() - 1
+                ret["exceptions"] = ~present
+                ret["exceptions"][present] = deviating
+                best = ret
+        return best
+
+    def aligned_values(self, col) -> np.ndarray:
+        """
+        Return the values of a df1 column aligned to the rows of df2;
+        use together with row_positions to mask out the new rows.
+        """
+
+        values = self.df1[col].to_numpy()
+        if len(values) == 0:
+            return np.full(len(self.row_positions), None, dtype=object)
+        return values.take(self.row_positions, mode="clip")
+
+    def _submit(self, executor: Executor) -> None:
+        if not (self.df1.columns.is_unique and self.df2.columns.is_unique):
+            return
+        for col in self.common_columns:
+            old, new = self.df1[col].to_numpy(), self.df2[col].to_numpy()
+            if old.dtype.kind in "biuf" and new.dtype.kind in "biuf":
+                self._pending[col] = executor.submit(
+                    _changed_rows, old, new, self.row_positions
+                )
+        if self._pending:
+            debug(f"diffing {len(self._pending)} columns in parallel")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+from hashlib import blake2b
+import pandas as pd
+
+
+def _digest(*chunks) -> str:
+    h = blake2b(digest_size=16)  # 128 bit
+    for chunk in chunks:
+        h.update(chunk)
+    return h.hexdigest()
+
+
+class Fingerprints:
+    """
+    Lazily computed and cached fingerprints of the columns of a
+    dataframe.
+
+    The fingerprint of a column is a 128-bit hash of its values
+    (hash_pandas_object), of the kind of its dtype and of the index of
+    the dataframe; it does not depend on the column name, so that the
+    same values under a different name (e.g. after a rename) share
+    the same fingerprint.
+
+    :param df: The dataframe whose columns will be fingerprinted.
+    """
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        self.df = df
+        self._index = None
+        self._columns = dict()
+
+    def __getitem__(self, col) -> str:
+        if col not in self._columns:
+            series = self.df[col]
+            self._columns[col] = _digest(
+                self.index_fingerprint().encode(),
+                series.dtype.kind.encode(),
+                pd.util.hash_pandas_object(series, index=False)
+                .to_numpy()
+                .tobytes(),
+            )
+        return self._columns[col]
+
+    def index_fingerprint(self) -> str:
+        """Return the fingerprint of the index of the dataframe"""
+        if self._index is None:
+            self._index = _digest(
+                pd.util.hash_pandas_object(self.df.index).to_numpy().tobytes()
+            )
+        return self._index
+
+    def rebind(self, df: pd.DataFrame) -> "Fingerprints":
+        """
+        Reuse the cached fingerprints for another dataframe holding
+        the same data (e.g. the snapshot "after" an activity which is
+        also the one "before" the next activity): only the ones of the
+        columns whose dtype and values are still equal are kept, and
+        none if the index differs.
+        """
+
+        ret = Fingerprints(df)
+        if not (
+            df.index.equals(self.df.index)
+            and df.columns.is_unique
+            and self.df.columns.is_unique
+        ):
+            return ret
+        ret._index = self._index
+        for col, fingerprint in self._columns.items():
+            if (
+                col in df.columns
+                and df[col].dtype == self.df[col].dtype
+                and df[col].equals(self.df[col])
+            ):
+                ret._columns[col] = fingerprint
+        return ret
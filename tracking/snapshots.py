@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections.abc import Mapping
+from logging import debug, warning
+from os import makedirs, remove
+from os.path import join as join_path
+from tempfile import TemporaryDirectory
+from tracking.diff import match_rows
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+
+class _ColumnVersion:
+    """
+    A single version of a column stored in a SnapshotStore.
+
+    It either owns its values or it is a row-delta of another
+    version, i.e. it only stores the positions to take from it.
+    Owned values may be spilled to disk, in that case only the path
+    of the file holding them is kept in memory.
+    """
+
+    __slots__ = ("values", "parent", "positions", "path", "dtype", "owner")
+
+    def __init__(self, values=None, parent=None, positions=None, owner=None):
+        self.values = values
+        self.parent = parent
+        self.positions = positions
+        self.path = None
+        self.dtype = None
+        # the Series the values are shared with under Copy-on-Write:
+        # holding it makes pandas copy them before any in place write
+        self.owner = owner
+
+    def nbytes(self) -> int:
+        """Return the amount of memory used by the version"""
+        if self.values is not None:
+            return int(self.values.nbytes)
+        if self.positions is not None:
+            return int(self.positions.nbytes)
+        return 0
+
+    def load(self):
+        """Return the spilled values, memory mapped"""
+        if self.path.endswith(".npy"):
+            return pd.array(
+                np.load(self.path, mmap_mode="r"),
+                dtype=self.dtype,
+                copy=False,
+            )
+        import pyarrow  # a dependency of the Arrow-backed dtypes
+
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(self.path)).read_all()
+        return self.dtype.__from_arrow__(table.column(0))
+
+    def spill(self, path: str) -> bool:
+        """
+        Move the values to disk, if they can be read back through a
+        memory map: NumPy-backed values go to a .npy file, Arrow-backed
+        ones (e.g. the pandas strings) to an Arrow IPC file.  Any other
+        values (Python objects, nullable and categorical dtypes, ...)
+        would be read back as a full copy, thus they are kept in memory.
+
+        :return: Whether the values were spilled.
+        """
+
+        values = self.values
+        if isinstance(values, pd.arrays.ArrowExtensionArray):
+            import pyarrow
+
+            table = pyarrow.table({"values": pyarrow.array(values)})
+            self.path = f"{path}.arrow"
+            with pyarrow.OSFile(self.path, "wb") as f:
+                with pyarrow.ipc.new_file(f, table.schema) as writer:
+                    writer.write_table(table)
+        else:
+            array = values.to_numpy()
+            if array.dtype == object or array.dtype != getattr(
+                values.dtype, "numpy_dtype", values.dtype
+            ):
+                return False
+            self.path = f"{path}.npy"
+            np.save(self.path, array, allow_pickle=False)
+        self.dtype = values.dtype
+        self.values, self.owner = None, None
+        return True
+
+
+def enable_copy_on_write() -> bool:
+    """
+    Enable the pandas Copy-on-Write mode (always on since pandas 3.0)
+    and return whether it is available; the mode is a global option,
+    thus it changes the semantics of every dataframe of the process.
+    """
+
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    try:
+        pd.set_option("mode.copy_on_write", True)
+    except (AttributeError, KeyError):  # i.e. pandas.errors.OptionError
+        return False
+    return True
+
+
+def _same_memory(old: np.ndarray, new: np.ndarray) -> bool:
+    """Whether two arrays are views of the very same memory"""
+    old, new = old.__array_interface__, new.__array_interface__
+    return all(
+        old[key] == new[key] for key in ("data", "shape", "strides", "typestr")
+    )
+
+
+def _row_hashes(columns: list) -> Optional[np.ndarray]:
+    """Hash the values of each row of the given columns, if possible"""
+    if not columns:
+        return None
+    try:
+        return pd.util.hash_pandas_object(
+            pd.DataFrame(dict(enumerate(columns)), copy=False), index=False
+        ).to_numpy()
+    except TypeError:  # e.g. unhashable values
+        return None
+
+
+class _Snapshot:
+    """
+    The layout of a dataframe: its index, its columns, for each
+    column the id of the stored version holding its values and, for
+    each row, its row id.
+    """
+
+    __slots__ = ("index", "columns", "versions", "row_ids")
+
+    def __init__(self, index, columns, versions, row_ids):
+        self.index = index
+        self.columns = columns
+        self.versions = versions
+        self.row_ids = row_ids
+
+
+class SnapshotStore(Mapping):
+    """
+    Store of the dataframes observed by the ProvenanceTracker.
+
+    Only the first snapshot is stored in full; each further snapshot
+    stores just the columns whose values changed w.r.t. the previous
+    one, while unchanged columns are shared and columns which only
+    lost or reordered rows are stored as the positions to take from
+    their previous version.  Frames are materialized on demand, and
+    the store behaves like the {operation_number: {"before": df_input,
+    "after": df_output}} dictionary expected by column_vision() and
+    column_entitiy_vision().
+
+    Each row gets a row id when first seen, which follows the row
+    across the snapshots as long as either its index label or its
+    values are kept (see diff.match_rows()): rows can thus be matched
+    by row id even after a reset_index(), a sort or a concat() with
+    ignore_index=True.  Rows keeping their labels are assumed not to
+    move as long as one of their columns keeps its values, otherwise
+    (e.g. after sort_values().reset_index(drop=True)) they are matched
+    by values as well.
+
+    When a memory_budget (in bytes) is given, the oldest column
+    versions exceeding it are spilled to spill_dir (a temporary
+    directory by default) and read back through memory maps; the
+    columns of the last snapshot and the ones which cannot be memory
+    mapped (see _ColumnVersion.spill()) are kept in memory.
+
+    With copy_on_write, the stored columns are not copied but shared
+    with the tracked dataframes, relying on pandas Copy-on-Write to
+    keep them unchanged; columns still sharing the memory of their
+    previous version are then recognized as unchanged in O(1).  Note
+    that Copy-on-Write is enabled for the whole process (see
+    enable_copy_on_write()).
+    """
+
+    def __init__(
+        self, memory_budget=None, spill_dir=None, copy_on_write=False
+    ) -> None:
+        if copy_on_write and not enable_copy_on_write():
+            warning("Copy-on-Write is not supported by this pandas version")
+            copy_on_write = False
+        self.copy_on_write = copy_on_write
+        self.memory_budget = memory_budget
+        self._spill_dir = spill_dir
+        self._tmp_dir = None
+        self._versions: dict[int, _ColumnVersion] = dict()
+        self._next_version_id = 0
+        self._next_row_id = 0
+        self._snapshots: list[_Snapshot] = list()
+        self._steps: list[tuple[int, int]] = list()
+        self._tip = None  # snapshot id which the next step starts from
+        self._last = None  # last stored snapshot
+        self._last_values = dict()  # and the values of its columns
+
+    def __getitem__(self, operation_number):
+        before, after = self._steps[operation_number]
+        return {
+            "before": self.materialize(before),
+            "after": self.materialize(after),
+            "row_ids": (self.row_ids(before), self.row_ids(after)),
+        }
+
+    def __getstate__(self) -> dict:
+        # spilled values are loaded back and shared ones are detached
+        # from the dataframes they are shared with
+        state = self.__dict__.copy()
+        state["_versions"] = dict()
+        for version_id, version in self._versions.items():
+            state["_versions"][version_id] = _ColumnVersion(
+                values=(
+                    version.values if version.path is None else version.load()
+                ),
+                parent=version.parent,
+                positions=version.positions,
+            )
+        state["_spill_dir"] = state["_tmp_dir"] = None
+        state["_last_values"] = dict()
+        return state
+
+    def __iter__(self):
+        return iter(range(len(self._steps)))
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    def __repr__(self) -> str:
+        return str(
+            f"{type(self).__name__}("
+            f"steps={len(self._steps)}, "
+            f"snapshots={sum(s is not None for s in self._snapshots)}, "
+            f"versions={len(self._versions)}, "
+            f"nbytes={self.nbytes()})"
+        )
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        if self._last is not None:
+            self._last_values = {
+                v: self._values(v) for v in self._last.versions
+            }
+
+    def nbytes(self) -> int:
+        """
+        Return the amount of memory used by the resident columns and
+        by the values of the last snapshot which are not resident
+        columns, e.g. the rows taken from their previous version
+        """
+
+        return sum(v.nbytes() for v in self._versions.values()) + sum(
+            int(values.nbytes)
+            for version_id, values in self._last_values.items()
+            if self._versions[version_id].values is None
+        )
+
+    def subscribe(self, df: pd.DataFrame) -> None:
+        """Store df as the starting point of the next step"""
+        self._tip = self._add_snapshot(df)
+
+    def append(self, df_after: pd.DataFrame) -> int:
+        """
+        Store df_after as the output of a new step whose input is the
+        previously subscribed/appended dataframe.
+
+        :param df_after: The dataframe returned by the operation.
+        :return: The operation number of the new step.
+        """
+
+        assert self._tip is not None, "Please subscribe a dataframe first"
+        after = self._add_snapshot(df_after)
+        self._steps.append((self._tip, after))
+        self._tip = after
+        return len(self._steps) - 1
+
+    def forget(self, operation_number: int) -> None:
+        """
+        Drop every snapshot preceding the output of the given step,
+        together with the column versions only they were using.
+        """
+
+        _, after = self._steps[operation_number]
+        alive = set()
+        for snapshot in self._snapshots[after:]:
+            for version_id in snapshot.versions:
+                alive.add(version_id)
+                alive.add(self._root(version_id))
+        for snapshot_id in range(after):
+            self._snapshots[snapshot_id] = None
+        for version_id in set(self._versions) - alive:
+            version = self._versions.pop(version_id)
+            if version.path is not None:
+                remove(version.path)
+
+    def materialize(self, snapshot_id: int) -> pd.DataFrame:
+        """Rebuild the dataframe stored as snapshot_id"""
+        snapshot = self._snapshots[snapshot_id]
+        if snapshot is None:
+            raise KeyError(f"Snapshot {snapshot_id} was already forgotten")
+        df = pd.DataFrame(
+            {
+                i: self._values(version_id)
+                for i, version_id in enumerate(snapshot.versions)
+            },
+            index=snapshot.index,
+            copy=False,
+        )
+        df.columns = snapshot.columns
+        return df
+
+    def row_ids(self, snapshot_id: int) -> np.ndarray:
+        """Return the row ids of the dataframe stored as snapshot_id"""
+        snapshot = self._snapshots[snapshot_id]
+        if snapshot is None:
+            raise KeyError(f"Snapshot {snapshot_id} was already forgotten")
+        return snapshot.row_ids
+
+    def _values(self, version_id: int):
+        version = self._versions[version_id]
+        if version.values is not None:
+            return version.values
+        if version.parent is None:
+            return version.load()
+        return self._values(version.parent).take(version.positions)
+
+    def _add_snapshot(self, df: pd.DataFrame) -> int:
+        last = self._last
+        last_version = (
+            dict()
+            if last is None or not last.columns.is_unique
+            else dict(zip(last.columns, last.versions))
+        )
+        positions = None
+        same_labels = last is not None and df.index.equals(last.index)
+        # whether each column kept its values under the same labels
+        unchanged = [
+            same_labels
+            and col in last_version
+            and self._unchanged(
+                df.iloc[:, i], self._last_values[last_version[col]]
+            )
+            for i, col in enumerate(df.columns)
+        ]
+        shared = [
+            kept
+            for kept, col in zip(unchanged, df.columns)
+            if col in last_version
+        ]
+        if last is None:
+            row_ids = self._new_row_ids(len(df.index))
+        elif same_labels and (any(shared) or not shared):
+            # a column kept its values, thus rows could only have
+            # moved among the ones equal in it
+            row_ids = last.row_ids
+        else:
+            # e.g. after sort_values().reset_index(drop=True) the
+            # labels are the same but the rows are not
+            matched = self._match_rows(df, last_version)
+            found = matched >= 0
+            row_ids = np.empty(len(matched), dtype=np.int64)
+            row_ids[found] = last.row_ids[matched[found]]
+            row_ids[~found] = self._new_row_ids(int((~found).sum()))
+            if found.all() and not (
+                same_labels and (matched == np.arange(len(matched))).all()
+            ):
+                # rows were only removed, reordered or relabeled
+                positions = matched
+
+        versions = list()
+        for i, col in enumerate(df.columns):
+            series = df.iloc[:, i]
+            values = series.array
+            version_id = last_version.get(col, None)
+            if version_id is not None:
+                old_values = self._last_values[version_id]
+                if positions is None and same_labels:
+                    if unchanged[i]:
+                        versions.append(version_id)
+                        continue
+                elif positions is not None:
+                    if old_values.take(positions).equals(values):
+                        versions.append(
+                            self._add_version(
+                                _ColumnVersion(
+                                    parent=self._root(version_id),
+                                    positions=self._compose(
+                                        version_id, positions
+                                    ),
+                                )
+                            )
+                        )
+                        continue
+            versions.append(
+                self._add_version(
+                    _ColumnVersion(values=values, owner=series)
+                    if self.copy_on_write
+                    else _ColumnVersion(values=values.copy())
+                )
+            )
+
+        snapshot = _Snapshot(df.index, df.columns, versions, row_ids)
+        self._snapshots.append(snapshot)
+        self._last = snapshot
+        self._last_values = {v: self._values(v) for v in versions}
+        self._enforce_memory_budget()
+        debug(f"{self!r}")
+        return len(self._snapshots) - 1
+
+    def _match_rows(self, df: pd.DataFrame, last_version: dict):
+        """
+        Match the rows of df with the ones of the last snapshot, by
+        index label and by the values of the columns they share.
+        """
+
+        common = (
+            [col for col in df.columns if col in last_version]
+            if df.columns.is_unique
+            else list()
+        )
+        return match_rows(
+            self._last.index,
+            df.index,
+            _row_hashes(
+                [self._last_values[last_version[col]] for col in common]
+            ),
+            _row_hashes([df[col].array for col in common]),
+        )
+
+    def _new_row_ids(self, n: int) -> np.ndarray:
+        ret = np.arange(
+            self._next_row_id, self._next_row_id + n, dtype=np.int64
+        )
+        self._next_row_id += n
+        return ret
+
+    def _unchanged(self, series: pd.Series, old_values) -> bool:
+        values = series.array
+        if (
+            self.copy_on_write
+            and isinstance(series.dtype, np.dtype)
+            and old_values.dtype == values.dtype
+            and _same_memory(old_values.to_numpy(), series.to_numpy())
+        ):
+            return True
+        return old_values.equals(values)
+
+    def _add_version(self, version: _ColumnVersion) -> int:
+        version_id = self._next_version_id
+        self._next_version_id += 1
+        self._versions[version_id] = version
+        return version_id
+
+    def _compose(self, version_id: int, positions):
+        version = self._versions[version_id]
+        if version.parent is None:
+            return positions
+        return version.positions.take(positions)
+
+    def _enforce_memory_budget(self) -> None:
+        if self.memory_budget is None:
+            return
+        resident = self.nbytes()
+        for version_id, version in self._versions.items():  # oldest first
+            if resident <= self.memory_budget:
+                break
+            # the values of the last snapshot are kept to diff the next
+            # one, spilling them would not free any memory
+            if version.values is None or version_id in self._last_values:
+                continue
+            nbytes = version.nbytes()
+            if version.spill(
+                join_path(self._get_spill_dir(), str(version_id))
+            ):
+                resident -= nbytes
+                debug(f"spilled column version {version_id} to {version.path}")
+
+    def _get_spill_dir(self) -> str:
+        if self._spill_dir is None:
+            self._tmp_dir = TemporaryDirectory(prefix="yaps_snapshots_")
+            self._spill_dir = self._tmp_dir.name
+        makedirs(self._spill_dir, exist_ok=True)
+        return self._spill_dir
+
+    def _root(self, version_id: int) -> int:
+        version = self._versions[version_id]
+        if version.parent is None:
+            return version_id
+        return version.parent
@@ -24,39 +24,62 @@
 # You should have received a copy of the GNU General Public License
 # along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
 
-import pandas as pd
+from tracking.snapshots import SnapshotStore
 
 
 class ProvenanceTracker:
-    def __init__(self, save_on_neo4j=False):
+    def __init__(
+        self,
+        save_on_neo4j=False,
+        memory_budget=None,
+        spill_dir=None,
+        on_change=None,
+        copy_on_write=False,
+    ):
         self.save_on_neo4j = save_on_neo4j
+        self.on_change = on_change
         self.tracking_enabled = False
-        self.changes: dict[int, dict[str, pd.DataFrame]] = dict()
+        self.changes = SnapshotStore(
+            memory_budget=memory_budget,
+            spill_dir=spill_dir,
+            copy_on_write=copy_on_write,
+        )
         self.operation_counter = 0
 
     def subscribe(self, df):
-        self.df_before = df.copy()
+        self.changes.subscribe(df)
         self.tracking_enabled = True
         return df
 
     """
     function that analyze changes before and after the operation
     the result will be a dictionary of dictionaries {operation_number:
-    {"before": df_input, "after": df_output}} where operation number
-    is the number of the operation/activity in chronological order of
-    execution
+    {"before": df_input, "after": df_output, "row_ids": (...)}} where
+    operation number is the number of the operation/activity in
+    chronological order of execution; the dataframes are stored as
+    deltas in a SnapshotStore and materialized only when looked up
+
+    when an on_change(operation_number, df_before, df_after, row_ids)
+    callback is given, e.g. ColumnEntityVision.step(), provenance is
+    extracted online: each step is handed to it as soon as it is
+    analyzed and its "before" snapshot is dropped right after; rows
+    are identified by the row_ids (see SnapshotStore.row_ids())
     """
 
     def analyze_changes(self, df_after):
         if not self.tracking_enabled:
             return
-        self.df_after = df_after.copy()
-        self.changes[self.operation_counter] = {
-            "before": self.df_before,
-            "after": self.df_after,
-        }
-        self.df_before = self.df_after.copy()
-        self.operation_counter += 1
+        operation_number = self.changes.append(df_after)
+        self.operation_counter = operation_number + 1
+        if self.on_change is not None:
+            step = self.changes[operation_number]
+            self.on_change(
+                operation_number,
+                step["before"],
+                step["after"],
+                step["row_ids"],
+            )
+            self.changes.forget(operation_number)
 
     def get_changes(self):
         return self.changes
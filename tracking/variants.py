@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from argparse import Namespace
+from graph.records import Record
+from os.path import splitext
+from tracking.column_approach import ColumnVision
+from tracking.column_entity_approach import ColumnEntityVision
+from tracking.diff import diff_pool, FrameDiff
+from typing import Dict, Iterator, List, Sequence
+
+#: The provenance extractions which can be run together: the column
+#: vision and the entity vision at each granularity level
+VARIANTS = ("column", "entity-1", "entity-2", "entity-3")
+
+
+def variant_of(args: Namespace) -> str:
+    """Return the variant selected by -e/-c and --granularity_level"""
+    if args.prov_entity_level:
+        return f"entity-{args.granularity_level}"
+    return "column"
+
+
+def variant_args(args: Namespace, variant: str, **kwargs) -> Namespace:
+    """
+    Return a copy of args selecting the given variant (see VARIANTS)
+    and with the given kwargs overridden.
+    """
+
+    assert variant in VARIANTS, f"Unknown extraction variant {variant!r}"
+    ret = Namespace(**vars(args))
+    ret.prov_entity_level = variant.startswith("entity-")
+    ret.prov_column_level = not ret.prov_entity_level
+    if ret.prov_entity_level:
+        ret.granularity_level = int(variant[len("entity-") :])  # noqa
+    for key, value in kwargs.items():
+        setattr(ret, key, value)
+    return ret
+
+
+def variant_path(path: str, variant: str) -> str:
+    """
+    Return the namespace of a variant written to a file sink, e.g.
+    provenance.jsonl -> provenance.entity-2.jsonl
+    """
+
+    root, ext = splitext(path)
+    return f"{root}.{variant}{ext}"
+
+
+class MultiVision:
+    """
+    Provenance extractor running several variants (see VARIANTS) in a
+    single pass over the dataframes.
+
+    Each step is diffed and fingerprinted just once, then handed to
+    the vision of each variant, which accumulates its own entities,
+    columns and relations over its own copy of the activities; the
+    LLM is asked about the used columns of each activity just once.
+
+    :param current_activities: The activities of the pipeline.
+    :param args: The command line arguments.
+    :param variants: The variants to extract, without duplicates.
+    :param used_columns_answers: The used columns answered by the LLM
+                                 for each activity number, if known.
+    """
+
+    def __init__(
+        self,
+        current_activities,
+        args,
+        variants: Sequence[str],
+        used_columns_answers=None,
+    ):
+        assert len(set(variants)) == len(variants), f"{variants=}"
+        self.used_columns_answers = (
+            used_columns_answers
+            if used_columns_answers is not None
+            else dict()
+        )
+        self.visions = dict()
+        for variant in variants:
+            vision_args = variant_args(args, variant, diff_workers=1)
+            self.visions[variant] = (
+                ColumnEntityVision
+                if vision_args.prov_entity_level
+                else ColumnVision
+            )(
+                [dict(activity) for activity in current_activities],
+                vision_args,
+                self.used_columns_answers,
+            )
+        # workers diffing the numeric columns, if any
+        self._executor = diff_pool(args.diff_workers)
+
+    def step(self, act, df1, df2, row_ids=None):
+        """Like ColumnEntityVision.step(), for each variant"""
+        if act == 0:
+            return  # subscribe() is followed by an analyze_changes()
+        diff = FrameDiff(df1, df2, self._executor, row_ids)
+        first = next(iter(self.visions.values()))
+        fingerprints = first.fingerprints(act, df1, df2)
+        for vision in self.visions.values():
+            vision.step(act, df1, df2, row_ids, diff, fingerprints)
+
+    def activities(self, variant: str) -> List[Dict[str, any]]:
+        """Return the activities of a variant"""
+        return self.visions[variant].current_activities
+
+    def drain(self, variant: str) -> Iterator[Record]:
+        """Like ColumnEntityVision.drain(), for the given variant"""
+        return self.visions[variant].drain()
+
+    def close(self) -> None:
+        """Release the workers diffing the columns, if any"""
+        for vision in self.visions.values():
+            vision.close()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
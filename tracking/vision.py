@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# coding: utf-8
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2024-2025 Federico Motta            <federico.motta@unimore.it>
+#                         Pasquale Leonardo Lazzaro <pas.lazzaro@stud.uniroma3.it>
+#                         Marialaura Lazzaro        <mar.lazzaro1@stud.uniroma3.it>
+# Copyright (C) 2022-2024 Luca Gregori              <luca.gregori@uniroma3.it>
+# Copyright (C) 2021-2022 Luca Lauro                <luca.lauro@uniroma3.it>
+#
+# This file is part of YAPS, a provenance capturing suite
+#
+# YAPS is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# YAPS is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YAPS.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from abc import ABC, abstractmethod
+from graph.ids import IdAllocator
+from graph.records import ActivityRecord, ColumnRecord, Record
+from graph.structure import create_column
+from itertools import islice
+from tracking.diff import diff_pool
+from tracking.fingerprint import Fingerprints
+from typing import Iterator
+
+
+class Vision(ABC):
+    """
+    Base class of the provenance extractors
+
+    Each call to step() diffs the dataframes before/after an activity
+    and accumulates what is found, which drain() yields as records
+    (see graph.records); subclasses (see ColumnVision and
+    ColumnEntityVision) implement step() and extend drain().
+    """
+
+    def __init__(self, current_activities, args, used_columns_answers=None):
+        self.current_activities = current_activities
+        self.args = args
+
+        self.ids = IdAllocator()
+        self.current_columns = dict()
+        # the activities diffed since the last drain(), and how many
+        # columns were already yielded by it
+        self._activities = list()
+        self._drained_columns = 0
+
+        # the used columns answered by the LLM for each activity number,
+        # which is asked only about the activities missing (e.g. from
+        # the answers of a snapshot archive, see tracking.archive)
+        self.used_columns_answers = (
+            used_columns_answers
+            if used_columns_answers is not None
+            else dict()
+        )
+        self.used_columns_giver = None  # created by the first question
+        # fingerprints of the last "after" dataframe, i.e. of the next
+        # "before" dataframe
+        self._fingerprints, self._last_act = None, None
+        # workers diffing the numeric columns, if any
+        self._executor = diff_pool(args.diff_workers)
+
+    @abstractmethod
+    def step(self, act, df1, df2, row_ids=None, diff=None, fingerprints=None):
+        """
+        Find the differences between df1 and df2, i.e. the dataframes
+        before and after the act-th activity, whose rows are matched
+        by their row_ids when given (see SnapshotStore.row_ids());
+        their FrameDiff and Fingerprints (see fingerprints()) can be
+        given as well, e.g. when shared by several visions
+        """
+
+    def _column(self, fingerprints, col):
+        """
+        Return the column named col of the fingerprinted dataframe,
+        creating it when it does not exist yet, and whether it was
+        created.
+        """
+
+        key = (fingerprints[col], col)
+        created = key not in self.current_columns
+        if created:
+            df = fingerprints.df
+            column = create_column(
+                str(df[col].tolist()),
+                str(df.index.tolist()),
+                col,
+                fingerprint=key[0],
+                ids=self.ids,
+            )
+            self.current_columns[key] = column
+        return self.current_columns[key], created
+
+    def fingerprints(self, act, df1, df2):
+        """
+        Return the Fingerprints of df1 and df2, i.e. the dataframes
+        before and after the act-th activity, reusing the ones of the
+        previous "after" dataframe when it is df1
+        """
+
+        return (
+            (
+                self._fingerprints.rebind(df1)
+                if self._fingerprints is not None and self._last_act == act - 1
+                else Fingerprints(df1)
+            ),
+            Fingerprints(df2),
+        )
+
+    def _used_columns_answer(self, act, df1, df2) -> str:
+        """
+        Return the LLM answer about the columns of df1 used by the
+        act-th activity, asking it only if the answer is unknown
+        """
+
+        if act not in self.used_columns_answers:
+            if self.used_columns_giver is None:
+                # the LLMs are loaded only when something is asked
+                from LLM.LLM_activities_used_columns import (
+                    LLM_activities_used_columns,
+                )
+
+                self.used_columns_giver = LLM_activities_used_columns()
+            activity = self.current_activities[act - 1]
+            self.used_columns_answers[act] = (
+                self.used_columns_giver.give_columns(
+                    df1, df2, activity["code"], activity["context"]
+                )
+            )
+        return self.used_columns_answers[act]
+
+    def drain(self) -> Iterator[Record]:
+        """
+        Yield the records (see graph.records) found since the last
+        call and forget them, but for the columns which are needed to
+        diff the next steps.
+        """
+
+        for activity in self._activities:
+            yield ActivityRecord(activity)
+        self._activities.clear()
+        for column in islice(
+            self.current_columns.values(), self._drained_columns, None
+        ):
+            yield ColumnRecord(column)
+        self._drained_columns = len(self.current_columns)
+
+    def close(self) -> None:
+        """Release the workers diffing the columns, if any"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @abstractmethod
+    def result(self):
+        """
+        Release the workers and return the eight collections expected
+        by the callers of column_entitiy_vision() and column_vision()
+        """
+
+    @classmethod
+    def extract(
+        cls, changes, current_activities, args, used_columns_answers=None
+    ):
+        """
+        Feed the vision with the ProvenanceTracker.changes and return
+        its result()
+        """
+
+        vision = cls(current_activities, args, used_columns_answers)
+        try:
+            for act in changes.keys():
+                if act == 0:
+                    continue
+                step = changes[act]  # materialize the snapshots just once
+                vision.step(
+                    act, step["before"], step["after"], step.get("row_ids")
+                )
+            return vision.result()
+        finally:
+            vision.close()
@@ -33,6 +33,7 @@ from argparse import (
 from black import __path__ as BLACK_PATH, __version__ as BLACK_VERSION
 from collections import defaultdict
 from datetime import datetime
+from graph.constants import WRITE_BATCH_SIZE
 from itertools import chain
 from logging import (
     DEBUG,
@@ -54,6 +55,7 @@ from subprocess import check_output
 from tempfile import NamedTemporaryFile
 from textwrap import dedent, fill, indent
 from time import time
+from tracking.diff import TRANSFORMATIONS
 import gzip
 import logging
 import pandas as pd
@@ -405,6 +407,160 @@ def parsed_args() -> Namespace:
         help="Granularity level: 1, 2 or 3",
         type=int,
     )
+    parser.add_argument(
+        "-b",
+        "--memory-budget",
+        default=None,
+        dest="memory_budget",
+        help="RAM budget (MiB) of the tracked snapshots, "
+        "older ones exceeding it are spilled to disk",
+        metavar="MiB",
+        type=int,
+    )
+    parser.add_argument(
+        "--spill-dir",
+        default=None,
+        dest="spill_dir",
+        help="where to spill snapshots (default: a temporary directory)",
+        metavar="dir",
+        type=str,
+    )
+    parser.add_argument(
+        "--budget",
+        default=None,
+        dest="budget",
+        help="approximate number of entities of the provenance graph: "
+        "the activities changing too many cells for their share of it "
+        "are compacted (see --compact and --row-sets) or sampled as at "
+        "granularity level 1; the column vision has no entities, thus "
+        "it needs -e or an entity vision in --extract",
+        metavar="ENTITIES",
+        type=int,
+    )
+    parser.add_argument(
+        "--compact",
+        action="append",
+        choices=TRANSFORMATIONS,
+        default=None,
+        dest="compact",
+        help="record the columns entirely cast, stripped or mapped by an "
+        "activity as a rule of their derivation, creating entities only "
+        "for the cells not following it (can be repeated)",
+    )
+    parser.add_argument(
+        "--copy-on-write",
+        action="store_true",
+        dest="copy_on_write",
+        help="share the unchanged columns of the tracked snapshots with "
+        "the pipeline dataframes, relying on pandas Copy-on-Write; with "
+        "pandas < 3.0 this enables Copy-on-Write for the whole process, "
+        "i.e. also for the pipeline",
+    )
+    parser.add_argument(
+        "--diff-workers",
+        default=1,
+        dest="diff_workers",
+        help="number of threads diffing the numeric columns of large "
+        "dataframes (at most the number of available CPUs)",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        "--extract",
+        action="append",
+        choices=("column", "entity-1", "entity-2", "entity-3"),
+        default=None,
+        dest="variants",
+        help="extract also the column vision or the entity vision at the "
+        "given granularity level, sharing the diffs with the one selected "
+        "by -e/-c/-g; each one is written to --sink-path with the "
+        "variant before the extension, thus not with --sink neo4j or "
+        "neo4j-async (can be repeated)",
+    )
+    parser.add_argument(
+        "--merge-edges",
+        action="store_true",
+        dest="merge_edges",
+        help="MERGE the Neo4j relations instead of CREATE-ing the ones "
+        "not written yet, e.g. when the database is not emptied first",
+    )
+    parser.add_argument(
+        "--neo4j-batch-size",
+        default=WRITE_BATCH_SIZE,
+        dest="neo4j_batch_size",
+        help="rows written to Neo4j by each transaction "
+        f"(default: {WRITE_BATCH_SIZE})",
+        metavar="ROWS",
+        type=int,
+    )
+    parser.add_argument(
+        "--neo4j-writers",
+        default=None,
+        dest="neo4j_writers",
+        help="concurrent Neo4j writers, each one with its own session "
+        "(or concurrent transactions of --sink neo4j-async; default: "
+        "number of CPUs - 1)",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        "--replay",
+        default=None,
+        dest="replay",
+        help="recompute provenance from a snapshot archive (see "
+        "--save-archive) instead of running the pipeline and the LLMs",
+        metavar="ARCHIVE",
+    )
+    parser.add_argument(
+        "--row-sets",
+        action="store_true",
+        dest="row_sets",
+        help="record the rows dropped by an activity only as row sets on "
+        "the activity and its columns, without invalidating their cells",
+    )
+    parser.add_argument(
+        "--save-archive",
+        default=None,
+        dest="save_archive",
+        help="save the snapshots, the activities and the LLM answers "
+        "about the used columns, to be replayed later (see --replay)",
+        metavar="ARCHIVE",
+    )
+    parser.add_argument(
+        "--sink",
+        choices=(
+            "csv",
+            "csv.gz",
+            "jsonl",
+            "neo4j",
+            "neo4j-async",
+            "null",
+            "parquet",
+        ),
+        default="neo4j",
+        dest="sink",
+        help="where to write provenance: the Neo4j database (default; "
+        "neo4j-async writes it with the asyncio driver while the next "
+        "activities are extracted), the (gzipped) CSV files of "
+        "neo4j-admin database import (see make neo4j-import), a "
+        "newline-delimited JSON file, Parquet node/edge tables or "
+        "nowhere (e.g. to measure the capture overhead)",
+    )
+    parser.add_argument(
+        "--sink-path",
+        default=None,
+        dest="sink_path",
+        help="file (jsonl) or directory (csv, parquet) to write "
+        "provenance to",
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        dest="streaming",
+        help="extract provenance while the pipeline runs, "
+        "keeping in memory only the last two dataframes",
+    )
     prov_lvl = parser.add_mutually_exclusive_group(required=True)
     prov_lvl.add_argument(
         "-e",
@@ -437,6 +593,18 @@ def parsed_args() -> Namespace:
     )
 
     _PARSE_ARGS = parser.parse_args()
+    if _PARSE_ARGS.variants and _PARSE_ARGS.sink in ("neo4j", "neo4j-async"):
+        # Neo4j Community Edition serves a single database
+        parser.error(
+            "--extract needs a file --sink (e.g. csv), the Neo4j sinks "
+            "can hold a single provenance graph"
+        )
+    if (
+        _PARSE_ARGS.budget is not None
+        and _PARSE_ARGS.prov_column_level
+        and not any(v.startswith("entity") for v in _PARSE_ARGS.variants or ())
+    ):
+        parser.error("--budget needs -e or an entity vision in --extract")
     for attr in ("formatted_pipeline", "pipeline_description"):
         path = getattr(_PARSE_ARGS, attr)
         if path is not None: